@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from media_probe import get_media_probe, ProbeError
+
+try:
+    import av
+except ImportError:  # 沒有 PyAV 時改用 ffmpeg 管線
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# Whisper 的輸入格式：16 kHz 單聲道 float32
+SAMPLE_RATE = 16000
+# 超過此長度（秒）的音訊改用 memmap，避免整段放在記憶體
+MEMMAP_THRESHOLD_SECONDS = 30 * 60
+
+
+class PCMBuffer:
+    """可成長的 float32 緩衝區；長音訊時以 np.memmap 存放於磁碟"""
+
+    def __init__(self, capacity: int, memmap_path: Optional[Path] = None):
+        self.capacity = max(capacity, SAMPLE_RATE)
+        self.memmap_path = memmap_path
+        self.size = 0
+        if memmap_path:
+            self.data = np.memmap(memmap_path, dtype=np.float32, mode='w+', shape=(self.capacity,))
+        else:
+            self.data = np.empty(self.capacity, dtype=np.float32)
+
+    def _grow(self, needed: int) -> None:
+        new_capacity = max(needed, int(self.capacity * 1.25))
+        if self.memmap_path:
+            self.data.flush()
+            del self.data
+            with open(self.memmap_path, 'r+b') as f:
+                f.truncate(new_capacity * 4)
+            self.data = np.memmap(self.memmap_path, dtype=np.float32, mode='r+', shape=(new_capacity,))
+        else:
+            grown = np.empty(new_capacity, dtype=np.float32)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.capacity = new_capacity
+
+    def append(self, samples: np.ndarray) -> None:
+        end = self.size + len(samples)
+        if end > self.capacity:
+            self._grow(end)
+        self.data[self.size:end] = samples
+        self.size = end
+
+    def result(self) -> np.ndarray:
+        if self.memmap_path:
+            self.data.flush()
+        return self.data[:self.size]
+
+
+class PCMStream:
+    """邊收邊解碼：逐步到達的壓縮音訊位元組送進 ffmpeg，解出的 PCM 累積在 PCMBuffer
+
+    寫入端以 feed() 送入資料、close() 表示來源結束；讀取端以 wait_for() 等到樣本足夠，
+    再用 view() 取出一段複本（緩衝區成長時會重新配置，不能直接持有切片）。
+    """
+
+    def __init__(self, capacity: int, memmap_path: Optional[Path] = None):
+        self.buffer = PCMBuffer(capacity, memmap_path)
+        self.done = False
+        self.error: Optional[str] = None
+        self._cond = threading.Condition()
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-i', 'pipe:0', '-vn',
+               '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', 'pipe:1']
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def feed(self, data: bytes) -> bool:
+        """送入一段壓縮音訊；解碼端已結束時回傳 False"""
+        try:
+            self._proc.stdin.write(data)
+            return True
+        except (BrokenPipeError, ValueError):
+            return False
+
+    def close(self) -> None:
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _read(self) -> None:
+        pending = b''
+        for chunk in iter(lambda: self._proc.stdout.read(1 << 16), b''):
+            chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % 4
+            with self._cond:
+                self.buffer.append(np.frombuffer(chunk[:usable], dtype=np.float32))
+                self._cond.notify_all()
+            pending = chunk[usable:]
+        stderr = self._proc.stderr.read()
+        with self._cond:
+            if self._proc.wait() != 0:
+                self.error = f"ffmpeg 解碼失敗: {stderr.decode(errors='ignore').strip()}"
+            self.done = True
+            self._cond.notify_all()
+
+    @property
+    def size(self) -> int:
+        with self._cond:
+            return self.buffer.size
+
+    def wait_for(self, samples: int) -> int:
+        """等到緩衝至少有 samples 個樣本（或來源已結束），回傳目前樣本數"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or self.buffer.size >= samples)
+            return self.buffer.size
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        with self._cond:
+            return np.array(self.buffer.data[start:min(end, self.buffer.size)])
+
+    def result(self) -> np.ndarray:
+        self._reader.join()
+        return self.buffer.result()
+
+
+def follow_file(path: Path, running: Callable[[], bool], poll_seconds: float = 0.5) -> Iterator[bytes]:
+    """逐步讀出仍在寫入中的檔案；寫入端結束且讀到檔尾後停止"""
+    while not path.exists():
+        if not running():
+            return
+        time.sleep(poll_seconds)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(1 << 20)
+            if data:
+                yield data
+            elif running():
+                time.sleep(poll_seconds)
+            else:
+                # 寫入端已結束，把最後寫入的部分讀完
+                rest = f.read()
+                if rest:
+                    yield rest
+                return
+
+
+def _decode_with_av(source: str, buffer: PCMBuffer) -> None:
+    with av.open(source) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=SAMPLE_RATE)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                buffer.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):
+            buffer.append(out.to_ndarray().reshape(-1))
+
+
+def _decode_with_ffmpeg(source: str, buffer: PCMBuffer) -> None:
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-i', source, '-vn',
+           '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', 'pipe:1']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    pending = b''
+    for chunk in iter(lambda: proc.stdout.read(1 << 20), b''):
+        chunk = pending + chunk
+        usable = len(chunk) - len(chunk) % 4
+        buffer.append(np.frombuffer(chunk[:usable], dtype=np.float32))
+        pending = chunk[usable:]
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg 解碼失敗: {stderr.decode(errors='ignore').strip()}")
+
+
+def decode_pcm(source, work_dir: Optional[Path] = None) -> np.ndarray:
+    """把任意影音檔直接解碼為 Whisper 可用的 16 kHz 單聲道 float32 陣列
+
+    依媒體資訊預先配置緩衝區；長音訊且有 work_dir 時以 memmap 寫在 work_dir/audio.pcm，
+    用完後由呼叫端刪除（見 release_pcm）。
+    """
+    source = str(source)
+    try:
+        duration = get_media_probe().duration(source) or 0
+    except ProbeError:
+        duration = 0
+    # 多留 1 秒避免重新配置
+    capacity = int((duration + 1) * SAMPLE_RATE)
+    memmap_path = None
+    if work_dir and duration > MEMMAP_THRESHOLD_SECONDS:
+        memmap_path = Path(work_dir) / "audio.pcm"
+    buffer = PCMBuffer(capacity, memmap_path)
+    logger.info(f"Decoding {source} to {SAMPLE_RATE} Hz mono PCM"
+                f"{' (memory-mapped)' if memmap_path else ''}...")
+    if av:
+        _decode_with_av(source, buffer)
+    else:
+        _decode_with_ffmpeg(source, buffer)
+    return buffer.result()
+
+
+def release_pcm(audio: np.ndarray) -> None:
+    """刪除 decode_pcm 建立的 memmap 暫存檔（切片後的 memmap 仍保有 filename）"""
+    filename = getattr(audio, 'filename', None)
+    if filename and os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Optional, List
+
+from paths import state_dir, file_lock
+
+logger = logging.getLogger(__name__)
+
+# 心跳間隔與逾時（秒）：超過逾時未更新的工作視為已結束，不再分配頻寬
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 10.0
+# yt-dlp 的 --limit-rate 只在啟動時設定：份額變動超過此比例時以新的上限重啟（續傳）
+RESHARE_RATIO = 0.25
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text: str) -> float:
+    """解析頻寬設定，例如 '500K'、'8M'、'1048576'（單位：bytes/s）"""
+    text = text.strip().upper().rstrip('/S').rstrip('B')
+    unit = text[-1] if text and text[-1] in _UNITS else ''
+    value = float(text[:-1] if unit else text)
+    if value <= 0:
+        raise ValueError(f"頻寬必須為正數: {text}")
+    return value * _UNITS[unit]
+
+
+class BandwidthGovernor:
+    """同一台主機所有下載共用的頻寬上限（token bucket）
+
+    每個工作只在下載期間於協調檔中登記心跳，總頻寬依目前存活的工作數平均分配；本行程內的所有
+    執行緒再共用自己的那一份 token bucket。下載結束後立即取消登記，轉錄等後續階段不佔份額。
+    """
+
+    def __init__(self, total_rate: float, state_path: Optional[str] = None):
+        self.total_rate = total_rate
+        self.state_path = state_path or str(state_dir() / "bandwidth.json")
+        self.lock_path = self.state_path + ".lock"
+        self.job_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._share = total_rate
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        # 本行程內同時進行中的下載數，最後一個結束時才取消登記
+        self._active = 0
+        self._atexit_registered = False
+
+    @classmethod
+    def from_env(cls) -> Optional['BandwidthGovernor']:
+        """依 VIDEO2SUM_BANDWIDTH_LIMIT 建立；未設定時回傳 None（不限速）"""
+        limit = os.getenv("VIDEO2SUM_BANDWIDTH_LIMIT", "").strip()
+        if not limit:
+            return None
+        try:
+            return cls(parse_rate(limit))
+        except ValueError:
+            logger.warning(f"Invalid VIDEO2SUM_BANDWIDTH_LIMIT={limit!r}, downloading without a bandwidth limit")
+            return None
+
+    def _heartbeat(self, leaving: bool = False) -> None:
+        """更新協調檔中的心跳，並重新計算本工作分得的頻寬"""
+        with file_lock(self.lock_path):
+            with self._lock:
+                # 取消登記前若已有新的下載開始，保留登記
+                leaving = leaving and self._thread is None
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    jobs = json.load(f).get('jobs', {})
+            except (FileNotFoundError, json.JSONDecodeError):
+                jobs = {}
+            now = time.time()
+            jobs = {k: v for k, v in jobs.items() if now - v < HEARTBEAT_TIMEOUT}
+            if leaving:
+                jobs.pop(self.job_id, None)
+            else:
+                jobs[self.job_id] = now
+            tmp_path = self.state_path + f".{self.job_id}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'total_rate': self.total_rate, 'jobs': jobs}, f)
+            os.replace(tmp_path, self.state_path)
+        with self._lock:
+            self._share = self.total_rate / max(1, len(jobs))
+
+    def _heartbeat_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                self._heartbeat()
+            except OSError:
+                continue
+
+    def start(self) -> 'BandwidthGovernor':
+        """登記本工作並開始送出心跳；與 stop 成對呼叫"""
+        with self._lock:
+            self._active += 1
+            if self._thread is not None:
+                return self
+            # 每個心跳執行緒有自己的停止事件，與 stop 在同一把鎖下建立與設定，
+            # 前一次 stop 尚未結束時重新 start 也不會誤停新的執行緒
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._heartbeat_loop, args=(self._stop,), daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self._shutdown)
+                self._atexit_registered = True
+        try:
+            self._heartbeat()
+        except OSError:
+            pass
+        return self
+
+    def stop(self) -> None:
+        """結束一個下載；沒有進行中的下載時取消登記，把頻寬讓給其他工作"""
+        with self._lock:
+            if self._active == 0:
+                return
+            self._active -= 1
+            if self._active:
+                return
+            thread = self._detach()
+        self._leave(thread)
+
+    def _shutdown(self) -> None:
+        with self._lock:
+            self._active = 0
+            thread = self._detach()
+        self._leave(thread)
+
+    def _detach(self) -> Optional[threading.Thread]:
+        """（持有 self._lock 時呼叫）停止目前的心跳執行緒並把它取下"""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+        return thread
+
+    def _leave(self, thread: Optional[threading.Thread]) -> None:
+        if thread is None:
+            return
+        thread.join(timeout=HEARTBEAT_INTERVAL)
+        try:
+            self._heartbeat(leaving=True)
+        except OSError:
+            pass
+
+    @contextmanager
+    def active(self):
+        """下載期間登記本工作，離開 with 區塊（含失敗）時取消登記"""
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    @property
+    def share(self) -> float:
+        """本工作目前分得的頻寬（bytes/s）"""
+        with self._lock:
+            return self._share
+
+    def consume(self, nbytes: int) -> None:
+        """取用 nbytes 個 token，不足時阻塞到補足為止（可多執行緒同時呼叫）"""
+        with self._lock:
+            now = time.monotonic()
+            rate = self._share
+            # bucket 容量為一秒的份額，允許短暫突發
+            self._tokens = min(rate, self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+            self._tokens -= nbytes
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    def ytdlp_args(self) -> List[str]:
+        """對應目前份額的 yt-dlp 限速參數"""
+        return ['--limit-rate', str(int(self.share))]
+
+    def popen_ytdlp(self, cmd: List[str]) -> 'ThrottledYtdlp':
+        """以目前份額啟動 yt-dlp，下載期間維持登記；介面同 subprocess.Popen"""
+        return ThrottledYtdlp(self, cmd)
+
+    def run_ytdlp(self, cmd: List[str]) -> None:
+        """同 subprocess.run(cmd, check=True)，但套用頻寬份額"""
+        proc = self.popen_ytdlp(cmd)
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+class ThrottledYtdlp:
+    """執行中的 yt-dlp：份額變動超過 RESHARE_RATIO 時以新的 --limit-rate 重啟，靠 yt-dlp 續傳接續
+
+    提供與 subprocess.Popen 相同的 poll / wait / kill；程序結束時取消登記。
+    """
+
+    def __init__(self, governor: BandwidthGovernor, cmd: List[str]):
+        self.governor = governor
+        self.cmd = cmd
+        self.returncode = None
+        self._lock = threading.Lock()
+        self._killed = False
+        governor.start()
+        try:
+            self._proc = self._spawn()
+        except Exception:
+            governor.stop()
+            raise
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def _spawn(self) -> subprocess.Popen:
+        self._rate = self.governor.share
+        return subprocess.Popen(self.cmd[:1] + self.governor.ytdlp_args() + self.cmd[1:])
+
+    def _watch(self) -> None:
+        try:
+            while True:
+                try:
+                    code = self._proc.wait(timeout=HEARTBEAT_INTERVAL)
+                except subprocess.TimeoutExpired:
+                    share = self.governor.share
+                    if abs(share - self._rate) <= self._rate * RESHARE_RATIO:
+                        continue
+                    with self._lock:
+                        if self._killed:
+                            continue
+                        print(f"頻寬份額變為 {share / 1024:.0f} KB/s，以新的上限重新啟動 yt-dlp（續傳）")
+                        self._proc.terminate()
+                        self._proc.wait()
+                        self._proc = self._spawn()
+                    continue
+                self.returncode = code
+                return
+        finally:
+            self.governor.stop()
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self) -> int:
+        self._watcher.join()
+        return self.returncode
+
+    def kill(self) -> None:
+        with self._lock:
+            self._killed = True
+            self._proc.kill()
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> Optional[BandwidthGovernor]:
+    """取得本行程共用的頻寬管理器；未設定限速時回傳 None。下載期間以 active() 登記"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = BandwidthGovernor.from_env()
+        return _governor
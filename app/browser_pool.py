@@ -0,0 +1,162 @@
+import os
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import psutil
+except ImportError:  # 選用：沒有 psutil 時只依使用次數回收
+    psutil = None
+
+# 預設池大小（可由 VIDEO2SUM_BROWSER_POOL_SIZE 設定）、每個瀏覽器最多使用次數、相對於剛啟動時允許成長的記憶體（MB）
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_USES = 25
+DEFAULT_MAX_RSS_GROWTH_MB = 512
+
+
+def _pool_size_from_env() -> int:
+    """讀取 VIDEO2SUM_BROWSER_POOL_SIZE；未設定或格式錯誤時使用預設值"""
+    value = os.getenv("VIDEO2SUM_BROWSER_POOL_SIZE", "").strip()
+    if not value:
+        return DEFAULT_POOL_SIZE
+    try:
+        return max(1, int(value))
+    except ValueError:
+        print(f"⚠️  VIDEO2SUM_BROWSER_POOL_SIZE 格式錯誤（{value}），改用預設 {DEFAULT_POOL_SIZE}")
+        return DEFAULT_POOL_SIZE
+
+
+class _PooledBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.baseline_rss = _browser_rss(driver)
+
+
+def _browser_rss(driver) -> Optional[int]:
+    """chromedriver 及其所有子行程（Chrome 各行程）的常駐記憶體總和"""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        return sum(p.memory_info().rss for p in [root] + root.children(recursive=True))
+    except (psutil.Error, AttributeError):
+        return None
+
+
+class BrowserPool:
+    """可重複使用的 headless Chrome 池
+
+    借出前做健康檢查；歸還時清除 cookies、回到 about:blank 並清空 performance log。
+    使用次數達上限或記憶體成長過多的瀏覽器會被關閉，下次借用時重新啟動。
+    """
+
+    def __init__(self, create_driver: Callable, size: Optional[int] = None,
+                 max_uses: int = DEFAULT_MAX_USES, max_rss_growth_mb: int = DEFAULT_MAX_RSS_GROWTH_MB):
+        self.create_driver = create_driver
+        self.size = max(1, size if size is not None else _pool_size_from_env())
+        self.max_uses = max_uses
+        self.max_rss_growth = max_rss_growth_mb * 1024 * 1024
+        self._slots = threading.Semaphore(self.size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+
+    @staticmethod
+    def _healthy(browser: _PooledBrowser) -> bool:
+        try:
+            return browser.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _quit(self, browser: _PooledBrowser) -> None:
+        self.recycled += 1
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self) -> _PooledBrowser:
+        while True:
+            with self._lock:
+                browser = self._idle.popleft() if self._idle else None
+            if browser is None:
+                print("啟動新的 headless Chrome...")
+                self.started += 1
+                return _PooledBrowser(self.create_driver())
+            if self._healthy(browser):
+                return browser
+            print("瀏覽器健康檢查失敗，重新啟動")
+            self._quit(browser)
+
+    def _reset(self, browser: _PooledBrowser) -> bool:
+        """清除狀態讓下一個工作使用"""
+        driver = browser.driver
+        try:
+            driver.switch_to.default_content()
+            driver.delete_all_cookies()
+            driver.get('about:blank')
+            try:
+                driver.get_log('performance')
+            except Exception:
+                pass
+            return True
+        except Exception:
+            return False
+
+    def _should_recycle(self, browser: _PooledBrowser) -> bool:
+        if browser.uses >= self.max_uses:
+            return True
+        rss = _browser_rss(browser.driver)
+        if rss is not None and browser.baseline_rss is not None:
+            return rss - browser.baseline_rss > self.max_rss_growth
+        return False
+
+    def _release(self, browser: _PooledBrowser, broken: bool) -> None:
+        browser.uses += 1
+        if broken or self._should_recycle(browser) or not self._reset(browser):
+            self._quit(browser)
+            return
+        with self._lock:
+            self._idle.append(browser)
+
+    @contextmanager
+    def borrow(self):
+        """借出一個 WebDriver，離開 with 區塊時自動歸還"""
+        self._slots.acquire()
+        browser = None
+        broken = False
+        try:
+            browser = self._acquire()
+            yield browser.driver
+        except Exception:
+            broken = browser is not None and not self._healthy(browser)
+            raise
+        finally:
+            if browser is not None:
+                self._release(browser, broken)
+            self._slots.release()
+
+    def close(self) -> None:
+        """關閉所有閒置的瀏覽器"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for browser in idle:
+            self._quit(browser)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(create_driver: Callable) -> BrowserPool:
+    """取得本行程共用的瀏覽器池（第一次呼叫時以 create_driver 建立），結束時自動關閉"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(create_driver)
+            atexit.register(_pool.close)
+        return _pool
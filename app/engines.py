@@ -0,0 +1,143 @@
+import os
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 載入前用來預估記憶體的參數量（float32 為 4 bytes/參數），載入後改用實際量測值
+MODEL_PARAMS = {
+    'tiny': 39_000_000,
+    'base': 74_000_000,
+    'small': 244_000_000,
+    'medium': 769_000_000,
+    'large': 1_550_000_000,
+}
+
+DEFAULT_ENGINE = "whisper"
+
+
+class TranscriptionEngine:
+    """轉錄引擎介面：載入模型並回傳與 openai-whisper 相同結構的結果
+
+    結果為 {'segments': [{'start', 'end', 'text'}, ...], 'text': str, 'language': str}，
+    SRT 寫入與 verify_srt 不需區分引擎。
+    """
+
+    name = ""
+
+    def load(self, model_name: str, threads: Optional[int] = None):
+        raise NotImplementedError
+
+    def transcribe(self, model, audio: np.ndarray, language: str, verbose: bool = True,
+                   prompt: Optional[str] = None) -> Dict:
+        """prompt 為前文（解碼上下文），接續前一段轉錄時使用"""
+        raise NotImplementedError
+
+    def estimate_bytes(self, model_name: str) -> int:
+        return MODEL_PARAMS.get(model_name, 0) * 4
+
+    def installed(self, model_name: str) -> bool:
+        """模型檔是否已在本機（不需下載即可載入）"""
+        return True
+
+    def model_bytes(self, model_name: str, model) -> int:
+        return self.estimate_bytes(model_name)
+
+
+class WhisperEngine(TranscriptionEngine):
+    """openai-whisper（PyTorch，float32）；原本的預設引擎"""
+
+    name = "whisper"
+
+    def load(self, model_name: str, threads: Optional[int] = None):
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads)
+        return whisper.load_model(model_name)
+
+    def transcribe(self, model, audio: np.ndarray, language: str, verbose: bool = True,
+                   prompt: Optional[str] = None) -> Dict:
+        return model.transcribe(audio, language=language, task="transcribe", verbose=verbose,
+                                initial_prompt=prompt)
+
+    def installed(self, model_name: str) -> bool:
+        import whisper
+        url = whisper._MODELS.get(model_name)
+        if not url:
+            return os.path.exists(model_name)
+        cache = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        return os.path.exists(os.path.join(cache, "whisper", os.path.basename(url)))
+
+    def model_bytes(self, model_name: str, model) -> int:
+        """模型實際佔用的參數與 buffer 大小"""
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        return total
+
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """faster-whisper（CTranslate2）；預設以 int8 量化在 CPU 上執行
+
+    量化方式可由 VIDEO2SUM_WHISPER_COMPUTE_TYPE 設定（如 int8、int8_float32、float32）。
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, compute_type: Optional[str] = None):
+        self.compute_type = compute_type or os.getenv("VIDEO2SUM_WHISPER_COMPUTE_TYPE", "int8")
+
+    def load(self, model_name: str, threads: Optional[int] = None):
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name, device="cpu", compute_type=self.compute_type,
+                            cpu_threads=threads or 0)
+
+    def transcribe(self, model, audio: np.ndarray, language: str, verbose: bool = True,
+                   prompt: Optional[str] = None) -> Dict:
+        # faster-whisper 需要連續的 float32 陣列，memmap 會先讀進記憶體
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        results, info = model.transcribe(audio, language=language, task="transcribe",
+                                         initial_prompt=prompt)
+        segments: List[Dict] = []
+        # results 是 generator，逐段解碼
+        for seg in results:
+            segments.append({'id': len(segments), 'start': seg.start, 'end': seg.end, 'text': seg.text})
+            if verbose:
+                print(f"[{_format_time(seg.start)} --> {_format_time(seg.end)}] {seg.text}")
+        return {'segments': segments, 'text': ''.join(s['text'] for s in segments),
+                'language': info.language}
+
+    def installed(self, model_name: str) -> bool:
+        from faster_whisper.utils import download_model
+        try:
+            download_model(model_name, local_files_only=True)
+            return True
+        except Exception:
+            return False
+
+    def estimate_bytes(self, model_name: str) -> int:
+        # int8 權重每個參數約 1 byte，其他量化方式以 float32 估算
+        per_param = 1 if self.compute_type.startswith('int8') else 4
+        return MODEL_PARAMS.get(model_name, 0) * per_param
+
+
+def _format_time(seconds: float) -> str:
+    """與 openai-whisper verbose 輸出相同的 mm:ss.mmm 格式"""
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:06.3f}"
+
+
+ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+
+def get_engine(name: Optional[str] = None) -> TranscriptionEngine:
+    """依名稱或 VIDEO2SUM_WHISPER_ENGINE 取得轉錄引擎（預設 whisper）"""
+    name = (name or os.getenv("VIDEO2SUM_WHISPER_ENGINE", DEFAULT_ENGINE)).strip().lower()
+    if name not in ENGINES:
+        raise ValueError(f"未知的轉錄引擎: {name}（可用: {', '.join(ENGINES)}）")
+    return ENGINES[name]()
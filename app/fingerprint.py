@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_decode import SAMPLE_RATE
+from paths import state_dir
+
+logger = logging.getLogger(__name__)
+
+# 只取音訊開頭這麼多秒計算指紋
+FINGERPRINT_SECONDS = 240
+# 每 10 ms 一個子指紋、分析窗長約 0.38 s（Haitsma-Kalker 式的高重疊）：
+# 相鄰子指紋高度相關，任意位移都有一個音框落在 5 ms 以內，剪輯差異不必剛好是整數音框
+FRAME_SECONDS = 0.01
+WINDOW_SAMPLES = 6144
+# 指紋格式版本，改變音框或頻帶設定時遞增
+FINGERPRINT_VERSION = 2
+# 比對時先每隔這麼多個音框取樣做粗搜尋，再於最佳幾個位移附近逐音框細搜尋
+COARSE_STEP = 8
+REFINE_CANDIDATES = 5
+# 300-3000 Hz 切成 16 個對數頻帶，相鄰頻帶能量差在時間上的變化取正負號 → 每個音框 15 bits
+BAND_EDGES_HZ = np.geomspace(300, 3000, 17)
+BITS = len(BAND_EDGES_HZ) - 2
+# 兩份複本開頭最多可差多少秒、至少需要重疊多少秒，以及判定為同一內容的位元錯誤率上限
+MAX_OFFSET_SECONDS = 120
+MIN_OVERLAP_SECONDS = 60
+MATCH_BIT_ERROR_RATE = 0.3
+# 總長相差超過此秒數的工作不比對
+MAX_DURATION_DIFF_SECONDS = 600
+
+_POPCOUNT = np.zeros(1 << 16, dtype=np.uint8)
+for _bit in range(16):
+    _POPCOUNT += ((np.arange(1 << 16) >> _bit) & 1).astype(np.uint8)
+
+
+def dedup_enabled() -> bool:
+    """比對誤判時會沿用另一場演講的逐字稿與筆記，因此預設關閉，需設定 VIDEO2SUM_DEDUP=1 啟用"""
+    return os.getenv("VIDEO2SUM_DEDUP", "").strip().lower() in ("1", "true", "yes", "y")
+
+
+def compute_fingerprint(audio: np.ndarray) -> np.ndarray:
+    """音訊開頭的聲學指紋：每個音框一個 15-bit 子指紋（uint16）
+
+    只看頻帶能量的相對起伏，音量、編碼格式與位元率不同的複本會得到幾乎相同的位元。
+    """
+    hop = int(SAMPLE_RATE * FRAME_SECONDS)
+    win = WINDOW_SAMPLES
+    audio = np.asarray(audio[:int(FINGERPRINT_SECONDS * SAMPLE_RATE)], dtype=np.float32)
+    n_frames = (len(audio) - win) // hop + 1
+    if n_frames < 2:
+        return np.zeros(0, dtype=np.uint16)
+    freqs = np.fft.rfftfreq(win, 1 / SAMPLE_RATE)
+    bins = np.searchsorted(freqs, BAND_EDGES_HZ)
+    window = np.hanning(win).astype(np.float32)
+    energy = np.empty((n_frames, len(bins) - 1), dtype=np.float64)
+    block = 500  # 每批 500 個音框（約 5 秒）
+    for i in range(0, n_frames, block):
+        j = min(i + block, n_frames)
+        idx = np.arange(win)[None, :] + hop * np.arange(i, j)[:, None]
+        spectrum = np.abs(np.fft.rfft(audio[idx] * window, axis=1)) ** 2
+        # reduceat 的最後一個索引會一路加到陣列結尾，捨棄該欄
+        energy[i:j] = np.add.reduceat(spectrum, bins, axis=1)[:, :-1]
+    diff = energy[:, :-1] - energy[:, 1:]
+    bits = (diff[1:] - diff[:-1]) > 0
+    return (bits * (1 << np.arange(BITS))).sum(axis=1).astype(np.uint16)
+
+
+def _bit_error_rate(new: np.ndarray, known: np.ndarray, shift: int, min_overlap: int,
+                    step: int = 1) -> Optional[float]:
+    """new 相對 known 位移 shift 個音框時的位元錯誤率；重疊不足時回傳 None"""
+    a = new[shift:] if shift >= 0 else new
+    b = known if shift >= 0 else known[-shift:]
+    n = min(len(a), len(b))
+    if n < min_overlap:
+        return None
+    return float(_POPCOUNT[a[:n:step] ^ b[:n:step]].sum()) / (len(range(0, n, step)) * BITS)
+
+
+def best_offset(new: np.ndarray, known: np.ndarray) -> Tuple[float, float]:
+    """在允許的位移範圍內找位元錯誤率最低的對齊，回傳 (錯誤率, 位移秒數)
+
+    位移為正表示同一段內容在 new 中出現得比在 known 中晚。先以抽樣的音框粗搜尋所有位移，
+    再對錯誤率最低的幾個位移在前後 COARSE_STEP 個音框內以全部音框細搜尋。
+    """
+    max_shift = int(MAX_OFFSET_SECONDS / FRAME_SECONDS)
+    min_overlap = int(MIN_OVERLAP_SECONDS / FRAME_SECONDS)
+    coarse = []
+    for shift in range(-max_shift, max_shift + 1, COARSE_STEP):
+        ber = _bit_error_rate(new, known, shift, min_overlap, COARSE_STEP)
+        if ber is not None:
+            coarse.append((ber, shift))
+    best = (1.0, 0.0)
+    checked = set()
+    for _, center in sorted(coarse)[:REFINE_CANDIDATES]:
+        for shift in range(max(-max_shift, center - COARSE_STEP), min(max_shift, center + COARSE_STEP) + 1):
+            if shift in checked:
+                continue
+            checked.add(shift)
+            ber = _bit_error_rate(new, known, shift, min_overlap)
+            if ber is not None and ber < best[0]:
+                best = (ber, shift * FRAME_SECONDS)
+    return best
+
+
+class FingerprintIndex:
+    """已處理工作的聲學指紋索引（SQLite），找出同一場演講的其他來源（鏡像、重新上傳、本地錄影）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(state_dir() / "fingerprints.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " source TEXT PRIMARY KEY,"
+                " fingerprint BLOB NOT NULL,"
+                " duration REAL NOT NULL,"
+                " srt_path TEXT NOT NULL,"
+                " md_path TEXT,"
+                " created_at REAL NOT NULL)"
+            )
+            # 指紋格式（音框間距）改變後舊指紋無法比對，清空讓之後處理的工作重新登記
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < FINGERPRINT_VERSION:
+                self._conn.execute("DELETE FROM fingerprints")
+                self._conn.execute(f"PRAGMA user_version = {FINGERPRINT_VERSION}")
+
+    def add(self, source: str, fingerprint: np.ndarray, duration: float,
+            srt_path: str, md_path: Optional[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (source, fingerprint, duration, srt_path, md_path, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (source, fingerprint.astype(np.uint16).tobytes(), duration, srt_path, md_path, time.time()))
+
+    def find(self, fingerprint: np.ndarray, duration: float, exclude_source: str) -> Optional[Dict]:
+        """找出最相近且錯誤率低於門檻的其他來源；產出檔已不存在的項目順便刪除"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, fingerprint, duration, srt_path, md_path FROM fingerprints"
+                " WHERE source != ? AND ABS(duration - ?) <= ?",
+                (exclude_source, duration, MAX_DURATION_DIFF_SECONDS)).fetchall()
+        best = None
+        stale: List[str] = []
+        for source, blob, known_duration, srt_path, md_path in rows:
+            if not os.path.exists(srt_path):
+                stale.append(source)
+                continue
+            ber, offset = best_offset(fingerprint, np.frombuffer(blob, dtype=np.uint16))
+            if ber <= MATCH_BIT_ERROR_RATE and (best is None or ber < best['ber']):
+                best = {'source': source, 'srt_path': srt_path,
+                        'md_path': md_path if md_path and os.path.exists(md_path) else None,
+                        'offset': offset, 'ber': ber}
+        if stale:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM fingerprints WHERE source = ?", [(s,) for s in stale])
+        return best
+
+
+_SRT_TIME = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3}) --> (\d{2}):(\d{2}):(\d{2}),(\d{3})')
+_NOTE_LINK = re.compile(r'\[(\d{1,2}):(\d{2}):(\d{2})\]\(([^)\s]*?)t=(\d+)s\)')
+
+
+def _srt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def shift_srt(content: str, offset: float) -> str:
+    """把 SRT 所有時間碼平移 offset 秒；平移後落在 0 秒之前的字幕捨棄並重新編號"""
+    cues = []
+    for block in re.split(r'\n\s*\n', content.strip()):
+        lines = block.splitlines()
+        index = next((i for i, line in enumerate(lines) if _SRT_TIME.match(line)), None)
+        if index is None:
+            continue
+        match = _SRT_TIME.match(lines[index])
+        g = [int(x) for x in match.groups()]
+        start = g[0] * 3600 + g[1] * 60 + g[2] + g[3] / 1000 + offset
+        end = g[4] * 3600 + g[5] * 60 + g[6] + g[7] / 1000 + offset
+        if end <= 0:
+            continue
+        text = lines[index + 1:]
+        cues.append(f"{_srt_time(max(0.0, start))} --> {_srt_time(end)}\n" + "\n".join(text))
+    return "".join(f"{i}\n{cue}\n\n" for i, cue in enumerate(cues, 1))
+
+
+def shift_notes(content: str, offset: float, old_url: str, new_url: str) -> str:
+    """重點筆記的時間碼連結平移 offset 秒，並把影片網址換成這次的來源"""
+    def repl(m):
+        seconds = max(0, int(m.group(5)) + int(round(offset)))
+        # 本地來源的連結沒有網址，直接補上；有網址的連結在下方統一替換
+        link = m.group(4) if old_url else new_url + m.group(4)
+        return f"[{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}]({link}t={seconds}s)"
+
+    content = _NOTE_LINK.sub(repl, content)
+    if old_url:
+        content = content.replace(old_url, new_url)
+    return content
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fingerprint_index() -> FingerprintIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex()
+        return _index
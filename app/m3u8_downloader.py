@@ -9,17 +9,207 @@ import argparse
 import time
 import tempfile
 import json
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Tuple, Union
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 import urllib.parse
 import re
+import hashlib
+import shutil
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from bandwidth import get_governor
+from paths import state_dir, file_lock
+from stream_cache import StreamCache
+from browser_pool import get_browser_pool
+
+DEFAULT_WORKERS = 8
+# 只含音訊的 codec 前綴（用於判斷 variant 是否為純音訊）
+AUDIO_CODEC_PREFIXES = ('mp4a', 'ac-3', 'ec-3', 'opus', 'mp3', 'flac')
+# 分段請求的連線 / 讀取逾時（秒）與重試設定
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 20.0
+DEFAULT_RETRIES = 4
+RETRY_BACKOFF = 0.5
+# 累積到這麼多筆延遲樣本後才開始以 p95 觸發 hedged request
+HEDGE_MIN_SAMPLES = 20
+# Selenium 網路監聽等待串流請求的上限（秒）
+DEFAULT_DISCOVERY_DEADLINE = 15.0
+STREAM_URL_PATTERN = re.compile(r'https?://[^\s"\'<>]+?\.(?:m3u8|mp4)(?:[?#][^\s"\'<>]*)?$', re.IGNORECASE)
+# 探索策略歷史中某策略勝率達此比例時，另一策略延後這麼多秒才啟動
+RACE_HEAD_START = 1.5
+RACE_PREFERENCE_RATIO = 0.8
+# 串流合併模式下，重排緩衝區最多保留 worker 數 × 此倍數個分段在記憶體中
+REORDER_WINDOW_FACTOR = 2
+
+
+class SegmentJournal:
+    """分段下載日誌：記錄已完成分段的大小與 SHA-256，供中斷後續傳"""
+
+    FILENAME = "journal.jsonl"
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        os.makedirs(work_dir, exist_ok=True)
+        self.path = os.path.join(work_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self.entries: Dict[int, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[int(entry['index'])] = entry
+                    except (json.JSONDecodeError, KeyError, ValueError):
+                        # 寫到一半被中斷的最後一行，直接忽略
+                        continue
+
+    @staticmethod
+    def for_stream(output_path: str, stream_url: str) -> 'SegmentJournal':
+        """在輸出檔所在的工作目錄下，為指定串流建立（或載入）日誌"""
+        # 以不含 query 的網址作為 key，避免簽章參數變動導致無法續傳
+        parsed = urllib.parse.urlparse(stream_url)
+        key = hashlib.sha1(f"{parsed.netloc}{parsed.path}".encode('utf-8')).hexdigest()[:16]
+        job_dir = os.path.dirname(os.path.abspath(output_path))
+        return SegmentJournal(os.path.join(job_dir, f".segments_{key}"))
+
+    def is_complete(self, index: int, seg_path: str) -> bool:
+        """分段已記錄完成且檔案大小、雜湊一致"""
+        entry = self.entries.get(index)
+        if not entry or not os.path.exists(seg_path):
+            return False
+        if os.path.getsize(seg_path) != entry['size']:
+            return False
+        return _sha256_file(seg_path) == entry['sha256']
+
+    def record(self, index: int, size: int, sha256: str) -> None:
+        """以 append 方式寫入一筆完成紀錄"""
+        entry = {'index': index, 'size': size, 'sha256': sha256}
+        with self._lock:
+            self.entries[index] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def cleanup(self) -> None:
+        """合併成功後刪除分段與日誌"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class LatencyStats:
+    """記錄單次下載中每個分段請求的延遲，提供 p95 門檻與尾延遲統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: List[float] = []
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+
+    def hedge_threshold(self) -> Optional[float]:
+        """目前為止的 p95 延遲；樣本不足時回傳 None（不 hedge）"""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.percentile(0.95)
+
+    def report(self) -> None:
+        """輸出尾延遲統計"""
+        if not self.samples:
+            return
+        p50, p95, p99 = (self.percentile(q) for q in (0.5, 0.95, 0.99))
+        print(f"分段延遲統計：n={len(self.samples)} p50={p50:.2f}s p95={p95:.2f}s "
+              f"p99={p99:.2f}s max={max(self.samples):.2f}s｜重試 {self.retries} 次，"
+              f"hedge {self.hedges} 次（備援勝出 {self.hedge_wins} 次）")
+
+
+class DiscoveryHistory:
+    """記錄各網站由哪種探索策略（requests / selenium）最先找到有效串流"""
+
+    STRATEGIES = ('requests', 'selenium')
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(state_dir() / "discovery_history.json")
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def order(self, host: str) -> Tuple[List[str], bool]:
+        """依歷史勝場排序策略；第二個值表示第一名是否明顯領先"""
+        wins = self._load().get(host, {})
+        ranked = sorted(self.STRATEGIES, key=lambda k: -wins.get(k, 0))
+        total = sum(wins.get(k, 0) for k in self.STRATEGIES)
+        dominant = total >= 3 and wins.get(ranked[0], 0) / total >= RACE_PREFERENCE_RATIO
+        return ranked, dominant
+
+    def record(self, host: str, strategy: str) -> None:
+        with file_lock(self.path + ".lock"):
+            data = self._load()
+            host_wins = data.setdefault(host, {})
+            host_wins[strategy] = host_wins.get(strategy, 0) + 1
+            tmp_path = self.path + f".{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def _with_bandwidth_share(method):
+    """下載期間向頻寬管理器登記，結束（含失敗）後立即讓出份額"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.governor:
+            return method(self, *args, **kwargs)
+        with self.governor.active():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _close_response(future) -> None:
+    """關閉落後的 hedged 請求的回應"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1048576), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
 
 class M3U8Downloader:
-    def __init__(self, user_agent: Optional[str] = None, referer: Optional[str] = None):
+    def __init__(self, user_agent: Optional[str] = None, referer: Optional[str] = None,
+                 max_workers: int = DEFAULT_WORKERS, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 hedge: bool = False, discovery_deadline: float = DEFAULT_DISCOVERY_DEADLINE,
+                 use_cache: bool = True):
         """初始化下載器"""
         self.user_agent = user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         self.referer = referer or 'https://gdcvault.com/'
@@ -27,6 +217,25 @@ class M3U8Downloader:
             'User-Agent': self.user_agent,
             'Referer': self.referer
         }
+        self.max_workers = max(1, max_workers)
+        # 共用 Session：所有分段走同一個 keep-alive 連線池；hedged request 會讓每個 worker
+        # 同時佔用兩條連線，連線池大小取 worker 數的兩倍，避免多出的連線用完即丟
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers * 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = max(0, retries)
+        self.hedge = hedge
+        self.discovery_deadline = discovery_deadline
+        # 已解析串流網址的持久快取（以 GDC ID 為 key），重跑時可略過探索
+        self.cache = StreamCache() if use_cache else None
+        self.stats = LatencyStats()
+        # 跨行程共用的頻寬上限（未設定 VIDEO2SUM_BANDWIDTH_LIMIT 時為 None），只在下載期間登記
+        self.governor = get_governor()
+        # hedged request 的備援請求使用獨立的執行緒池，避免與分段 worker 互相等待
+        self._hedge_pool = ThreadPoolExecutor(max_workers=self.max_workers * 2) if hedge else None
 
     def _extract_gdc_id(self, url: str) -> Optional[str]:
         """從 URL 中提取 GDC ID"""
@@ -82,8 +291,8 @@ class M3U8Downloader:
             print(f"使用 requests 方式失敗: {str(e)}")
             return []
 
-    def _get_urls_with_selenium(self, url: str) -> List[str]:
-        """使用 Selenium 獲取串流 URL"""
+    def _chrome_options(self) -> Options:
+        """Headless Chrome 設定：開啟 performance log 以監聽網路請求"""
         options = Options()
         options.add_argument('--headless')
         options.add_argument('--disable-gpu')
@@ -91,198 +300,631 @@ class M3U8Downloader:
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--log-level=3')
         options.add_argument('--enable-javascript')
+        # 跨網域 iframe（播放器）預設在獨立行程，其網路事件不會出現在 performance log
+        options.add_argument('--disable-features=IsolateOrigins,site-per-process')
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        # driver.get 立即返回，不等整頁載入完成，才能在播放器一發出請求就結束
+        options.page_load_strategy = 'none'
+        return options
+
+    def _capture_stream_requests(self, driver, deadline: float,
+                                 cancel: Optional[threading.Event] = None) -> List[str]:
+        """輪詢 DevTools Network 事件，一看到 .m3u8/.mp4 請求就回傳；超過期限或被取消時回傳空清單"""
+        end = time.time() + deadline
+        while time.time() < end and not (cancel and cancel.is_set()):
+            for entry in driver.get_log('performance'):
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, json.JSONDecodeError):
+                    continue
+                params = message.get('params', {})
+                if message.get('method') == 'Network.requestWillBeSent':
+                    request_url = params.get('request', {}).get('url', '')
+                elif message.get('method') == 'Network.responseReceived':
+                    request_url = params.get('response', {}).get('url', '')
+                else:
+                    continue
+                if STREAM_URL_PATTERN.match(request_url):
+                    print(f"從網路請求中找到串流: {request_url}")
+                    return [request_url]
+            time.sleep(0.1)
+        return []
+
+    def _get_urls_with_selenium(self, url: str, cancel: Optional[threading.Event] = None) -> List[str]:
+        """使用 Selenium 獲取串流 URL：先監聽網路請求，期限內沒有結果再掃描頁面"""
+        pool = get_browser_pool(self._create_driver)
+        try:
+            with pool.borrow() as driver:
+                return self._discover_with_driver(driver, url, cancel)
+        except Exception as e:
+            print(f"使用 selenium 方式失敗: {str(e)}")
+            return []
+
+    def _create_driver(self):
+        """啟動一個 headless Chrome（由瀏覽器池呼叫）"""
+        return webdriver.Chrome(options=self._chrome_options(), service=Service())
+
+    def _discover_with_driver(self, driver, url: str, cancel: Optional[threading.Event] = None) -> List[str]:
+        """在借來的瀏覽器中開啟頁面並尋找串流 URL"""
+        print(f"訪問頁面: {url}")
+        start = time.time()
+        driver.get(url)
         
-        driver = None
+        print("監聽播放器網路請求...")
+        urls = self._capture_stream_requests(driver, self.discovery_deadline, cancel)
+        if urls:
+            print(f"網路監聽耗時 {time.time() - start:.2f} 秒")
+            return urls
+        if cancel and cancel.is_set():
+            return []
+
+        print("網路監聽未找到串流，改為掃描頁面內容...")
         try:
-            service = Service()
-            driver = webdriver.Chrome(options=options, service=service)
-            
-            print(f"訪問頁面: {url}")
-            driver.get(url)
-            
-            print("等待頁面載入...")
-            time.sleep(5)
+            WebDriverWait(driver, 10).until(
+                lambda d: d.execute_script("return document.readyState") == 'complete')
+        except TimeoutException:
+            print("頁面尚未載入完成，直接掃描目前內容")
 
-            # 獲取所有 cookies
-            cookies = driver.get_cookies()
-            cookie_string = '; '.join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
-            
-            # 尋找 iframe 中的播放器
-            iframes = driver.find_elements(By.TAG_NAME, "iframe")
-            if iframes:
-                print(f"找到 {len(iframes)} 個 iframe")
-                for idx, iframe in enumerate(iframes):
-                    try:
-                        print(f"檢查 iframe {idx + 1}")
-                        driver.switch_to.frame(iframe)
-                        
-                        # 檢查播放器腳本
-                        scripts = driver.find_elements(By.TAG_NAME, "script")
-                        for script in scripts:
-                            src = script.get_attribute('src')
-                            if src and ('script_VOD.js' in src or 'player.js' in src):
-                                print("找到播放器腳本")
-                                # 嘗試從不同的變數中獲取 URL
-                                possible_vars = [
-                                    "window.PLAYBACK_URL",
-                                    "window.playbackUrl",
-                                    "window.videoUrl",
-                                    "window.streamUrl"
-                                ]
-                                
-                                for var in possible_vars:
-                                    try:
-                                        playback_url = driver.execute_script(f"return {var};")
-                                        if playback_url and isinstance(playback_url, str):
-                                            print(f"找到播放 URL: {playback_url}")
-                                            return [playback_url]
-                                    except:
-                                        continue
-                        
-                        # 檢查播放器元素
-                        video_elements = driver.find_elements(By.TAG_NAME, "video")
-                        for video in video_elements:
-                            src = video.get_attribute('src')
-                            if src and ('.m3u8' in src or '.mp4' in src):
-                                print(f"在 video 元素中找到視頻源: {src}")
-                                return [src]
-                        
-                        # 檢查 video.js 播放器
-                        video_js = driver.find_elements(By.CLASS_NAME, "video-js")
-                        for player in video_js:
-                            for attr in ['data-setup', 'data-sources']:
+        # 獲取所有 cookies
+        cookies = driver.get_cookies()
+        cookie_string = '; '.join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
+        
+        # 尋找 iframe 中的播放器
+        iframes = driver.find_elements(By.TAG_NAME, "iframe")
+        if iframes:
+            print(f"找到 {len(iframes)} 個 iframe")
+            for idx, iframe in enumerate(iframes):
+                try:
+                    print(f"檢查 iframe {idx + 1}")
+                    driver.switch_to.frame(iframe)
+                    
+                    # 檢查播放器腳本
+                    scripts = driver.find_elements(By.TAG_NAME, "script")
+                    for script in scripts:
+                        src = script.get_attribute('src')
+                        if src and ('script_VOD.js' in src or 'player.js' in src):
+                            print("找到播放器腳本")
+                            # 嘗試從不同的變數中獲取 URL
+                            possible_vars = [
+                                "window.PLAYBACK_URL",
+                                "window.playbackUrl",
+                                "window.videoUrl",
+                                "window.streamUrl"
+                            ]
+                            
+                            for var in possible_vars:
                                 try:
-                                    data = player.get_attribute(attr)
-                                    if data:
-                                        sources = json.loads(data)
-                                        if isinstance(sources, dict) and 'sources' in sources:
-                                            urls = [s['src'] for s in sources['sources'] if 'src' in s]
-                                            if urls:
-                                                print(f"在 video.js 播放器中找到視頻源:")
-                                                for url in urls:
-                                                    print(url)
-                                                return urls
+                                    playback_url = driver.execute_script(f"return {var};")
+                                    if playback_url and isinstance(playback_url, str):
+                                        print(f"找到播放 URL: {playback_url}")
+                                        return [playback_url]
                                 except:
                                     continue
-                                    
-                    except Exception as e:
-                        print(f"處理 iframe {idx + 1} 時發生錯誤: {str(e)}")
-                    finally:
-                        driver.switch_to.parent_frame()
-            
-            # 如果在 iframe 中沒有找到，檢查主頁面
-            print("檢查主頁面...")
-            page_source = driver.page_source
-            patterns = [
-                r'https?://[^\s<>"]+?\.m3u8',
-                r'https?://[^\s<>"]+?\.mp4',
-                r'"url":"(https?://[^"]+?\.m3u8)"',
-                r'source:\s*["\']([^"\']+?\.m3u8)["\']',
-                r'playlist:\s*["\']([^"\']+?\.m3u8)["\']',
-                r'PLAYBACK_URL\s*=\s*["\']([^"\']+)["\']',
-                r'playbackUrl\s*=\s*["\']([^"\']+)["\']',
-                r'videoUrl\s*=\s*["\']([^"\']+)["\']',
-                r'streamUrl\s*=\s*["\']([^"\']+)["\']'
-            ]
-            
-            all_urls = []
-            for pattern in patterns:
-                urls = re.findall(pattern, page_source)
-                if urls:
-                    print(f"\n使用模式 {pattern} 找到的 URLs:")
-                    for url in urls:
-                        if isinstance(url, tuple):
-                            url = url[0]
-                        if '.m3u8' in url or '.mp4' in url:
-                            print(url)
-                            all_urls.append(url)
-            
-            if all_urls:
-                return list(set(all_urls))
-            
-            print("\n在頁面中沒有找到媒體 URL")
+                    
+                    # 檢查播放器元素
+                    video_elements = driver.find_elements(By.TAG_NAME, "video")
+                    for video in video_elements:
+                        src = video.get_attribute('src')
+                        if src and ('.m3u8' in src or '.mp4' in src):
+                            print(f"在 video 元素中找到視頻源: {src}")
+                            return [src]
+                    
+                    # 檢查 video.js 播放器
+                    video_js = driver.find_elements(By.CLASS_NAME, "video-js")
+                    for player in video_js:
+                        for attr in ['data-setup', 'data-sources']:
+                            try:
+                                data = player.get_attribute(attr)
+                                if data:
+                                    sources = json.loads(data)
+                                    if isinstance(sources, dict) and 'sources' in sources:
+                                        urls = [s['src'] for s in sources['sources'] if 'src' in s]
+                                        if urls:
+                                            print(f"在 video.js 播放器中找到視頻源:")
+                                            for url in urls:
+                                                print(url)
+                                            return urls
+                            except:
+                                continue
+                                
+                except Exception as e:
+                    print(f"處理 iframe {idx + 1} 時發生錯誤: {str(e)}")
+                finally:
+                    driver.switch_to.parent_frame()
+        
+        # 如果在 iframe 中沒有找到，檢查主頁面
+        print("檢查主頁面...")
+        page_source = driver.page_source
+        patterns = [
+            r'https?://[^\s<>"]+?\.m3u8',
+            r'https?://[^\s<>"]+?\.mp4',
+            r'"url":"(https?://[^"]+?\.m3u8)"',
+            r'source:\s*["\']([^"\']+?\.m3u8)["\']',
+            r'playlist:\s*["\']([^"\']+?\.m3u8)["\']',
+            r'PLAYBACK_URL\s*=\s*["\']([^"\']+)["\']',
+            r'playbackUrl\s*=\s*["\']([^"\']+)["\']',
+            r'videoUrl\s*=\s*["\']([^"\']+)["\']',
+            r'streamUrl\s*=\s*["\']([^"\']+)["\']'
+        ]
+        
+        all_urls = []
+        for pattern in patterns:
+            urls = re.findall(pattern, page_source)
+            if urls:
+                print(f"\n使用模式 {pattern} 找到的 URLs:")
+                for url in urls:
+                    if isinstance(url, tuple):
+                        url = url[0]
+                    if '.m3u8' in url or '.mp4' in url:
+                        print(url)
+                        all_urls.append(url)
+        
+        if all_urls:
+            return list(set(all_urls))
+        
+        print("\n在頁面中沒有找到媒體 URL")
+        return []
+
+    def _stream_status(self, stream_url: str) -> Optional[int]:
+        """檢查串流網址：m3u8 以 GET 取得播放清單（內容不是播放清單時視為 404），
+        其他檔案以 HEAD 檢查；回傳 HTTP 狀態碼，連線失敗回傳 None"""
+        try:
+            if '.m3u8' in stream_url.lower():
+                r = self.session.get(stream_url, timeout=self.timeout)
+                if r.ok and not r.text.lstrip().startswith('#EXTM3U'):
+                    return 404
+                return r.status_code
+            r = self.session.head(stream_url, timeout=self.timeout, allow_redirects=True)
+            return r.status_code
+        except requests.RequestException:
+            return None
+
+    def _is_reachable_stream(self, stream_url: str) -> bool:
+        """確認串流網址可用"""
+        status = self._stream_status(stream_url)
+        return status is not None and status < 400
+
+    def _get_cached_stream_urls(self, key: str) -> List[str]:
+        """取出快取並以一次輕量請求驗證；403/404 時作廢該筆快取"""
+        urls = self.cache.get(key)
+        if not urls:
             return []
-            
-        except Exception as e:
-            print(f"使用 selenium 方式失敗: {str(e)}")
+        status = self._stream_status(urls[-1])
+        if status is not None and status < 400:
+            print(f"使用快取的串流網址（{key}）")
+            return urls
+        if status in (403, 404):
+            print(f"快取的串流網址已失效（HTTP {status}），重新探索")
+            self.cache.invalidate(key)
+        return []
+
+    def _race_stream_urls(self, url: str) -> List[str]:
+        """同時執行 requests 與 selenium 探索，回傳最先找到的有效串流並取消另一方
+
+        若某策略在此網站的歷史勝率明顯領先，先啟動它，另一策略延後 RACE_HEAD_START 秒。
+        """
+        host = urllib.parse.urlparse(url).netloc
+        history = DiscoveryHistory()
+        order, dominant = history.order(host)
+        cancel = threading.Event()
+        probes = {
+            'requests': lambda: self._get_urls_with_requests(url),
+            'selenium': lambda: self._get_urls_with_selenium(url, cancel),
+        }
+
+        def run(strategy, delay):
+            if delay and cancel.wait(delay):
+                return strategy, []
+            found = probes[strategy]()
+            return strategy, [u for u in dict.fromkeys(found) if self._is_reachable_stream(u)]
+
+        print(f"\n同時使用 requests 與 selenium 方式尋找（優先: {order[0]}）:")
+        pool = ThreadPoolExecutor(max_workers=len(order))
+        try:
+            pending = {pool.submit(run, strategy, RACE_HEAD_START if dominant and i else 0)
+                       for i, strategy in enumerate(order)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    strategy, urls = future.result()
+                    if urls:
+                        cancel.set()
+                        print(f"由 {strategy} 方式勝出")
+                        history.record(host, strategy)
+                        return urls
             return []
         finally:
-            if driver:
-                driver.quit()
+            cancel.set()
+            # 不等待落後的策略；selenium 看到 cancel 後會停止探索，借出的瀏覽器由瀏覽器池重設後收回
+            pool.shutdown(wait=False)
 
     def get_stream_urls(self, url: str, method: str = 'requests') -> List[str]:
-        """獲取影片串流網址"""
+        """獲取影片串流網址（先查快取，找到後寫回快取）"""
+        if STREAM_URL_PATTERN.match(url):
+            # 已經是串流網址（例如由呼叫端先行探索），不必再開瀏覽器
+            return [url]
+        if not self.cache:
+            return self._discover_stream_urls(url, method)
+        key = StreamCache.make_key(url, self._extract_gdc_id(url))
+        urls = self._get_cached_stream_urls(key)
+        if not urls:
+            urls = self._discover_stream_urls(url, method)
+            if urls:
+                self.cache.put(key, urls)
+        return urls
+
+    def _discover_stream_urls(self, url: str, method: str) -> List[str]:
+        """依指定方式探索串流網址"""
+        if method == 'race':
+            return self._race_stream_urls(url)
+
         found_urls = []
+        strategies = [m for m in ('requests', 'selenium') if method in (m, 'both')]
+        host = urllib.parse.urlparse(url).netloc
+        history = DiscoveryHistory()
+        if method == 'both':
+            # 依此網站的歷史勝場決定先試哪一種
+            strategies, _ = history.order(host)
         
-        if method in ['requests', 'both']:
-            print("\n使用 requests 方式尋找:")
-            urls = self._get_urls_with_requests(url)
-            found_urls.extend(urls)
-        
-        if method in ['selenium', 'both'] and not found_urls:
-            print("\n使用 selenium 方式尋找:")
-            urls = self._get_urls_with_selenium(url)
+        for strategy in strategies:
+            if found_urls:
+                break
+            print(f"\n使用 {strategy} 方式尋找:")
+            if strategy == 'requests':
+                urls = self._get_urls_with_requests(url)
+            else:
+                urls = self._get_urls_with_selenium(url)
             found_urls.extend(urls)
+            if urls and method == 'both':
+                history.record(host, strategy)
         
         return list(set(found_urls))
 
-    def download_audio(self, url: str, output_path: str, format: str = 'mp3', quality: Union[int, str] = 4) -> bool:
-        """下載音頻（加上進度條）"""
+    def _audio_codec_args(self, format: str, quality: Union[int, str]) -> List[str]:
+        """依輸出格式產生 ffmpeg 音訊編碼參數（copy 表示不重新編碼）"""
+        if format.lower() == 'copy':
+            return ['-c:a', 'copy']
+        if format.lower() == 'mp3':
+            return ['-c:a', 'libmp3lame', '-q:a', str(quality)]
+        return ['-c:a', 'aac', '-b:a', '192k']
+
+    def _timed_get(self, uri: str, headers: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        """發出一次帶逾時的 GET 並記錄延遲；stream=True 時只等到回應標頭，內容由呼叫端邊讀邊寫"""
+        start = time.time()
+        r = self.session.get(uri, headers=headers, timeout=self.timeout, stream=stream)
+        if not stream:
+            r.content
+        self.stats.add(time.time() - start)
+        if self.governor and not stream:
+            self.governor.consume(len(r.content))
+        return r
+
+    def _hedged_get(self, uri: str, headers: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        """請求超過目前 p95 延遲仍未完成時，再送出一個相同請求，取先回來的結果"""
+        threshold = self.stats.hedge_threshold()
+        primary = self._hedge_pool.submit(self._timed_get, uri, headers, stream)
+        if threshold is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        self.stats.count('hedges')
+        backup = self._hedge_pool.submit(self._timed_get, uri, headers, stream)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.stats.count('hedge_wins')
+                    # 落後的請求無法中斷，讓它在逾時內自行結束並關閉回應（stream 模式下才會歸還連線）
+                    for other in (pending | done) - {future}:
+                        other.add_done_callback(_close_response)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _request_segment(self, uri: str, headers: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        """帶逾時、指數退避重試（連線錯誤 / 5xx / 429）與選用 hedging 的分段請求"""
+        for attempt in range(self.retries + 1):
+            try:
+                r = (self._hedged_get(uri, headers, stream) if self.hedge
+                     else self._timed_get(uri, headers, stream))
+                if r.status_code < 500 and r.status_code != 429:
+                    return r
+                r.close()
+                error = requests.HTTPError(f"{r.status_code} for {uri}", response=r)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.retries:
+                self.stats.count('retries')
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        raise error
+
+    def _fetch_segment(self, uri: str, seg_path: str) -> Tuple[int, str]:
+        """下載單一分段到檔案，回傳 (位元組數, SHA-256)
+
+        內容邊收邊寫；傳輸中斷時保留已寫入的部分，重試（或下次執行）時以 Range 只補抓缺少的位元組。
+        """
+        for attempt in range(self.retries + 1):
+            h = hashlib.sha256()
+            existing = os.path.getsize(seg_path) if os.path.exists(seg_path) else 0
+            headers = {'Range': f'bytes={existing}-'} if existing else None
+            with self._request_segment(uri, headers, stream=True) as r:
+                if r.status_code == 416:
+                    # 伺服器表示範圍超出，代表先前已完整寫入
+                    return existing, _sha256_file(seg_path)
+                r.raise_for_status()
+                if existing and r.status_code == 206:
+                    mode = 'ab'
+                    with open(seg_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(1048576), b''):
+                            h.update(chunk)
+                    size = existing
+                else:
+                    # 不支援 Range 時從頭重抓
+                    mode = 'wb'
+                    size = 0
+                try:
+                    with open(seg_path, mode) as f:
+                        for chunk in r.iter_content(chunk_size=65536):
+                            if self.governor:
+                                self.governor.consume(len(chunk))
+                            f.write(chunk)
+                            h.update(chunk)
+                            size += len(chunk)
+                    return size, h.hexdigest()
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    error = e
+            if attempt < self.retries:
+                self.stats.count('retries')
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        raise error
+
+    def _download_segments(self, segments, journal: SegmentJournal) -> List[str]:
+        """以固定大小的執行緒池並行下載分段，回傳依播放清單順序排列的檔案路徑"""
+        jobs = []
+        for i, seg in enumerate(segments):
+            if isinstance(seg.uri, str):
+                jobs.append((i, seg.absolute_uri, os.path.join(journal.work_dir, f"seg_{i}.ts")))
+        pending = [job for job in jobs if not journal.is_complete(job[0], job[2])]
+        if len(pending) < len(jobs):
+            print(f"從日誌續傳：略過 {len(jobs) - len(pending)} 個已完成分段")
+        total_bytes = 0
+        start = time.time()
+
+        def fetch(index, uri, path):
+            size, digest = self._fetch_segment(uri, path)
+            journal.record(index, size, digest)
+            return size
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool, \
+                tqdm(total=len(jobs), initial=len(jobs) - len(pending), desc="下載分段", unit="段") as pbar:
+            futures = [pool.submit(fetch, *job) for job in pending]
+            try:
+                for future in as_completed(futures):
+                    size = future.result()
+                    total_bytes += size
+                    self._update_progress(pbar, size, total_bytes, start)
+            except BaseException:
+                # 任一分段失敗就取消尚未開始的分段，不必等整個播放清單下載完才回報錯誤
+                # （已完成的分段已寫入日誌，重跑時續傳）
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+        # 檔案路徑依分段索引產生，直接回傳即為播放順序
+        return [path for _, _, path in jobs]
+
+    @staticmethod
+    def _update_progress(pbar, size: int, total_bytes: int, start: float) -> None:
+        """在進度條顯示單段大小、累計量與吞吐量"""
+        elapsed = max(time.time() - start, 1e-6)
+        pbar.set_postfix(seg=f"{size / 1024:.0f}KB",
+                         total=f"{total_bytes / 1048576:.1f}MB",
+                         speed=f"{total_bytes / 1048576 / elapsed:.2f}MB/s")
+        pbar.update(1)
+
+    def _fetch_segment_bytes(self, uri: str) -> bytes:
+        """下載單一分段到記憶體"""
+        r = self._request_segment(uri)
+        r.raise_for_status()
+        return r.content
+
+    def _stream_merge(self, segments, output_path: str, format: str, quality: Union[int, str]) -> bool:
+        """串流合併：分段依序直接寫入 ffmpeg stdin，不落地任何暫存檔
+
+        下載仍並行進行，但最多只預抓 max_workers × REORDER_WINDOW_FACTOR 個分段，
+        以限制重排緩衝區的記憶體用量。此模式不使用續傳日誌。
+        """
+        uris = [seg.absolute_uri for seg in segments if isinstance(seg.uri, str)]
+        if not uris:
+            print("沒有可用的分段，下載失敗。")
+            return False
+        init_section = getattr(segments[0], 'init_section', None)
+        cmd = ['ffmpeg', '-i', 'pipe:0', '-map', '0:a:0', '-vn']
+        cmd.extend(self._audio_codec_args(format, quality))
+        cmd.extend(['-y', output_path])
+        print(f"串流合併並轉檔到: {output_path}")
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        window = self.max_workers * REORDER_WINDOW_FACTOR
+        total_bytes = 0
+        start = time.time()
+        try:
+            if init_section is not None and init_section.uri:
+                # fMP4 串流需先送出初始化分段
+                proc.stdin.write(self._fetch_segment_bytes(init_section.absolute_uri))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool, \
+                    tqdm(total=len(uris), desc="串流分段", unit="段") as pbar:
+                futures = {}
+                next_submit = 0
+                for next_write in range(len(uris)):
+                    while next_submit < len(uris) and next_submit < next_write + window:
+                        futures[next_submit] = pool.submit(self._fetch_segment_bytes, uris[next_submit])
+                        next_submit += 1
+                    data = futures.pop(next_write).result()
+                    proc.stdin.write(data)
+                    total_bytes += len(data)
+                    self._update_progress(pbar, len(data), total_bytes, start)
+        except BrokenPipeError:
+            print("ffmpeg 提前結束，串流中斷。")
+        except Exception:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            if proc.stdin and not proc.stdin.closed:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+        proc.wait()
+        if proc.returncode != 0:
+            print("ffmpeg 轉檔失敗！")
+            return False
+        print("音頻下載完成！")
+        return True
+
+    def _load_playlist(self, url: str):
+        """以共用 Session（帶 Referer/User-Agent）載入 m3u8 播放清單"""
+        r = self.session.get(url, timeout=self.timeout)
+        if r.status_code in (403, 404) and self.cache:
+            # 快取中的網址已過期或被撤銷，下次改為重新探索
+            self.cache.invalidate_stream(url)
+        r.raise_for_status()
+        return m3u8.loads(r.text, uri=url)
+
+    @staticmethod
+    def _is_audio_only(playlist) -> bool:
+        """variant 是否只含音訊"""
+        info = playlist.stream_info
+        if info.codecs:
+            codecs = [c.strip().lower() for c in info.codecs.split(',')]
+            return all(c.startswith(AUDIO_CODEC_PREFIXES) for c in codecs)
+        return not info.resolution and not info.video
+
+    def _select_audio_playlist(self, url: str):
+        """若為 master playlist，挑出最省流量的音訊來源，回傳 (media playlist URL, 物件)
+
+        優先順序：純音訊 variant（最低頻寬）→ EXT-X-MEDIA 音訊 rendition → 最低頻寬 variant。
+        """
+        playlist = self._load_playlist(url)
+        if not playlist.is_variant:
+            return url, playlist
+        variants = [p for p in playlist.playlists if p.uri]
+        bandwidth = lambda p: p.stream_info.bandwidth or p.stream_info.average_bandwidth or 0
+
+        audio_variants = [p for p in variants if self._is_audio_only(p)]
+        if audio_variants:
+            chosen = min(audio_variants, key=bandwidth)
+            print(f"選用純音訊 variant（{bandwidth(chosen)} bps）: {chosen.absolute_uri}")
+            return self._select_audio_playlist(chosen.absolute_uri)
+
+        renditions = [m for m in playlist.media if (m.type or '').upper() == 'AUDIO' and m.uri]
+        if renditions:
+            # rendition 本身沒有頻寬資訊，以引用該 group 的最低 variant 頻寬估計，同分時優先 DEFAULT
+            def group_bandwidth(media):
+                refs = [bandwidth(p) for p in variants if p.stream_info.audio == media.group_id]
+                return (min(refs) if refs else 0, 0 if (media.default or '').upper() == 'YES' else 1)
+            chosen = min(renditions, key=group_bandwidth)
+            print(f"選用 EXT-X-MEDIA 音訊 rendition（group={chosen.group_id}）: {chosen.absolute_uri}")
+            return self._select_audio_playlist(chosen.absolute_uri)
+
+        if variants:
+            chosen = min(variants, key=bandwidth)
+            print(f"沒有純音訊來源，選用最低頻寬 variant（{bandwidth(chosen)} bps）: {chosen.absolute_uri}")
+            return self._select_audio_playlist(chosen.absolute_uri)
+        return url, playlist
+
+    @_with_bandwidth_share
+    def download_audio(self, url: str, output_path: str, format: str = 'mp3', quality: Union[int, str] = 4,
+                       stream_merge: bool = False) -> bool:
+        """下載音頻（加上進度條）；stream_merge=True 時分段直接串流進 ffmpeg"""
         try:
             os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-            # 先取得 m3u8 檔案所有分段
-            m3u8_obj = m3u8.load(url)
+            # 先取得 m3u8 檔案所有分段（master playlist 會先挑選音訊 rendition）
+            media_url, m3u8_obj = self._select_audio_playlist(url)
             segments = m3u8_obj.segments
             if not segments:
                 print("無法取得 m3u8 分段，將直接用 ffmpeg 下載（無進度條）")
                 return self._ffmpeg_download(url, output_path, format, quality)
-            # 逐段下載
-            temp_dir = tempfile.mkdtemp()
-            segment_files = []
-            for i, seg in enumerate(tqdm(segments, desc="下載分段", unit="段")):
-                if isinstance(seg.uri, str):
-                    seg_path = os.path.join(temp_dir, f"seg_{i}.ts")
-                    r = requests.get(seg.uri, headers=self.headers, stream=True)
-                    with open(seg_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    segment_files.append(seg_path)
-            # 合併分段
-            if segment_files:
-                concat_file = os.path.join(temp_dir, "concat.txt")
-                with open(concat_file, 'w') as f:
-                    for seg_file in segment_files:
-                        f.write(f"file '{seg_file}'\n")
-                cmd = [
-                    'ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_file,
-                    '-c:a', 'libmp3lame' if format.lower() == 'mp3' else 'aac',
-                    '-q:a', str(quality) if format.lower() == 'mp3' else '-b:a', '192k',
-                    '-y', output_path
-                ]
-                print(f"合併分段並轉檔到: {output_path}")
-                subprocess.run(cmd, check=True)
-                print("音頻下載完成！")
-                return True
-            else:
-                print("沒有可用的分段檔案，下載失敗。")
-                return False
+            # 每次下載重新統計分段延遲，結束（含失敗）時輸出尾延遲
+            self.stats = LatencyStats()
+            try:
+                if stream_merge:
+                    return self._stream_merge(segments, output_path, format, quality)
+                # 並行下載分段（工作目錄位於輸出資料夾，中斷後可續傳）
+                journal = SegmentJournal.for_stream(output_path, media_url)
+                print(f"以 {self.max_workers} 個連線並行下載 {len(segments)} 個分段")
+                segment_files = self._download_segments(segments, journal)
+                # 合併分段
+                if segment_files:
+                    concat_file = os.path.join(journal.work_dir, "concat.txt")
+                    with open(concat_file, 'w') as f:
+                        for seg_file in segment_files:
+                            f.write(f"file '{seg_file}'\n")
+                    # 分段可能是影音混合的 variant，只取第一條音軌，copy 時才不會把視訊封裝進 .m4a
+                    cmd = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_file, '-map', '0:a:0', '-vn']
+                    cmd.extend(self._audio_codec_args(format, quality))
+                    cmd.extend(['-y', output_path])
+                    print(f"合併分段並轉檔到: {output_path}")
+                    subprocess.run(cmd, check=True)
+                    journal.cleanup()
+                    print("音頻下載完成！")
+                    return True
+                else:
+                    print("沒有可用的分段檔案，下載失敗。")
+                    return False
+            finally:
+                self.stats.report()
         except Exception as e:
             print(f"下載過程中發生錯誤: {str(e)}")
             return False
 
-    def _ffmpeg_download(self, url, output_path, format, quality):
-        cmd = [
-            'ffmpeg',
-            '-headers', f'Referer: {self.headers["Referer"]}\r\nUser-Agent: {self.headers["User-Agent"]}\r\n',
-            '-i', url,
-            '-vn'
-        ]
-        if format.lower() == 'mp3':
-            cmd.extend(['-c:a', 'libmp3lame', '-q:a', str(quality)])
+    def _throttled_fetch(self, url: str, path: str) -> None:
+        """透過頻寬管理器限速下載單一檔案；失敗時刪除不完整的檔案"""
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+                total = int(r.headers.get('content-length', 0)) or None
+                with open(path, 'wb') as f, tqdm(total=total, desc="限速下載", unit="B", unit_scale=True) as pbar:
+                    for chunk in r.iter_content(chunk_size=65536):
+                        self.governor.consume(len(chunk))
+                        f.write(chunk)
+                        pbar.update(len(chunk))
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    def _output_args(self, video_output: Optional[str], audio_output: Optional[str],
+                     format: str, quality: Union[int, str]) -> List[str]:
+        """ffmpeg 輸出參數：同一個輸入可同時產生 MP4（不重新編碼）與音訊檔"""
+        args = []
+        if video_output:
+            args.extend(['-map', '0:v:0?', '-map', '0:a:0?', '-c', 'copy', '-y', video_output])
+        if audio_output:
+            args.extend(['-map', '0:a:0', '-vn'])
+            args.extend(self._audio_codec_args(format, quality))
+            args.extend(['-y', audio_output])
+        return args
+
+    def _ffmpeg_download(self, url, output_path, format, quality, video_output: Optional[str] = None):
+        """由 ffmpeg 直接讀取網址；output_path 為音訊輸出（可為 None），video_output 為影片輸出"""
+        source = None
+        if self.governor and '.m3u8' not in url.lower():
+            # ffmpeg 本身無法限速：先以受頻寬管理的 Session 下載原始檔，再交給 ffmpeg 轉檔
+            source = (output_path or video_output) + '.src'
+            self._throttled_fetch(url, source)
+            input_args = ['-i', source]
         else:
-            cmd.extend(['-c:a', 'aac', '-b:a', '192k'])
-        cmd.extend(['-y', output_path])
-        print(f"開始下載音頻到: {output_path}")
+            if self.governor:
+                print("⚠️  ffmpeg 直接讀取 HLS 時無法套用頻寬上限")
+            input_args = [
+                '-headers', f'Referer: {self.headers["Referer"]}\r\nUser-Agent: {self.headers["User-Agent"]}\r\n',
+                '-i', url
+            ]
+        cmd = ['ffmpeg'] + input_args + self._output_args(video_output, output_path, format, quality)
+        print(f"開始下載到: {', '.join(p for p in (video_output, output_path) if p)}")
         proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, universal_newlines=True)
         pbar = None
         try:
@@ -301,6 +943,8 @@ class M3U8Downloader:
             proc.wait()
             if pbar:
                 pbar.close()
+            if source and os.path.exists(source):
+                os.remove(source)
             if proc.returncode == 0:
                 print("音頻下載完成！")
                 return True
@@ -313,33 +957,113 @@ class M3U8Downloader:
             print(f"下載過程中發生錯誤: {str(e)}")
             return False
 
-    def download_video(self, url: str, output_path: str) -> bool:
-        """下載完整影片（加上進度條）"""
+    def _select_video_playlist(self, url: str):
+        """master playlist 時挑選最高頻寬的 variant，回傳 (media playlist URL, 物件)；
+        若該 variant 的音訊是獨立 rendition（分段不含音訊）則回傳 (None, None)"""
+        playlist = self._load_playlist(url)
+        if not playlist.is_variant:
+            return url, playlist
+        variants = [p for p in playlist.playlists if p.uri and not self._is_audio_only(p)]
+        if not variants:
+            return None, None
+        chosen = max(variants, key=lambda p: p.stream_info.bandwidth or p.stream_info.average_bandwidth or 0)
+        if chosen.stream_info.audio and any(
+                m.uri for m in playlist.media if m.group_id == chosen.stream_info.audio):
+            return None, None
+        print(f"選用最高頻寬 variant（{chosen.stream_info.bandwidth} bps）: {chosen.absolute_uri}")
+        return self._select_video_playlist(chosen.absolute_uri)
+
+    @_with_bandwidth_share
+    def download_video(self, url: str, output_path: str, audio_output: Optional[str] = None,
+                       format: str = 'mp3', quality: Union[int, str] = 4) -> bool:
+        """下載完整影片（加上進度條）；指定 audio_output 時，同一次下載一併產生音訊檔"""
         try:
             os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-            # 直接用 ffmpeg 下載，並加上進度條
-            return self._ffmpeg_download(url, output_path, 'mp4', 4)
+            media_url, m3u8_obj = self._select_video_playlist(url) if '.m3u8' in url.lower() else (None, None)
+            if not m3u8_obj or not m3u8_obj.segments:
+                # 非 HLS 或影音分離的串流交給 ffmpeg 直接處理，同樣只讀取一次
+                return self._ffmpeg_download(url, audio_output, format, quality, video_output=output_path)
+            self.stats = LatencyStats()
+            try:
+                journal = SegmentJournal.for_stream(output_path, media_url)
+                print(f"以 {self.max_workers} 個連線並行下載 {len(m3u8_obj.segments)} 個分段")
+                segment_files = self._download_segments(m3u8_obj.segments, journal)
+            finally:
+                self.stats.report()
+            if not segment_files:
+                print("沒有可用的分段檔案，下載失敗。")
+                return False
+            concat_file = os.path.join(journal.work_dir, "concat.txt")
+            with open(concat_file, 'w') as f:
+                for seg_file in segment_files:
+                    f.write(f"file '{seg_file}'\n")
+            # 一次 ffmpeg：分段封裝成 MP4，同時抽出音訊
+            cmd = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_file]
+            cmd.extend(self._output_args(output_path, audio_output, format, quality))
+            print(f"合併分段到: {', '.join(p for p in (output_path, audio_output) if p)}")
+            subprocess.run(cmd, check=True)
+            journal.cleanup()
+            print("影片下載完成！")
+            return True
         except Exception as e:
             print(f"下載過程中發生錯誤: {str(e)}")
             return False
 
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_downloader() -> M3U8Downloader:
+    """本行程共用的下載器：批次處理多個工作時沿用同一個 Session、串流網址快取與瀏覽器池"""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = M3U8Downloader()
+        return _downloader
+
+
 def main():
     parser = argparse.ArgumentParser(description='M3U8 串流下載工具')
     parser.add_argument('url', help='影片網址')
     parser.add_argument('--output', '-o', required=True, help='輸出檔案路徑')
-    parser.add_argument('--method', choices=['requests', 'selenium', 'both'], 
-                      default='both', help='URL 獲取方法 (預設: both)')
+    parser.add_argument('--method', choices=['requests', 'selenium', 'both', 'race'], 
+                      default='both', help='URL 獲取方法；race 為同時執行、取先找到者 (預設: both)')
     parser.add_argument('--type', choices=['video', 'audio'], 
                       default='video', help='下載類型 (預設: video)')
-    parser.add_argument('--format', choices=['mp3', 'aac'], 
-                      default='mp3', help='音訊格式 (僅用於音訊下載, 預設: mp3)')
+    parser.add_argument('--audio-output',
+                      help='下載影片時同時輸出的音訊檔路徑 (僅用於影片下載)')
+    parser.add_argument('--format', choices=['mp3', 'aac', 'copy'], 
+                      default='mp3', help='音訊格式，copy 為不重新編碼 (僅用於音訊下載, 預設: mp3)')
     parser.add_argument('--quality', type=int, default=4,
                       help='MP3 音質等級 0-9 (僅用於 MP3, 預設: 4)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                      help=f'並行下載分段的連線數 (預設: {DEFAULT_WORKERS})')
+    parser.add_argument('--timeout', type=float, nargs=2, metavar=('CONNECT', 'READ'),
+                      default=[DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT],
+                      help=f'分段請求的連線 / 讀取逾時秒數 (預設: {DEFAULT_CONNECT_TIMEOUT} {DEFAULT_READ_TIMEOUT})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                      help=f'分段失敗時的重試次數，採指數退避 (預設: {DEFAULT_RETRIES})')
+    parser.add_argument('--hedge', action='store_true',
+                      help='分段超過目前 p95 延遲時送出備援請求，取先完成者')
+    parser.add_argument('--discovery-deadline', type=float, default=DEFAULT_DISCOVERY_DEADLINE,
+                      help=f'selenium 監聽串流請求的最長秒數 (預設: {DEFAULT_DISCOVERY_DEADLINE})')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='不使用已解析串流網址的快取，每次重新探索')
+    parser.add_argument('--stream-merge', action='store_true',
+                      help='分段直接串流進 ffmpeg 轉檔，不寫入暫存檔 (不支援續傳)')
     
     args = parser.parse_args()
     
     # 建立下載器實例
-    downloader = M3U8Downloader()
+    downloader = M3U8Downloader(
+        max_workers=args.workers,
+        connect_timeout=args.timeout[0],
+        read_timeout=args.timeout[1],
+        retries=args.retries,
+        hedge=args.hedge,
+        discovery_deadline=args.discovery_deadline,
+        use_cache=not args.no_cache
+    )
     
     # 獲取串流 URL
     print(f"正在獲取串流網址: {args.url}")
@@ -359,10 +1083,17 @@ def main():
             stream_url, 
             args.output,
             format=args.format,
-            quality=args.quality
+            quality=args.quality,
+            stream_merge=args.stream_merge
         )
     else:
-        success = downloader.download_video(stream_url, args.output)
+        success = downloader.download_video(
+            stream_url,
+            args.output,
+            audio_output=args.audio_output,
+            format=args.format,
+            quality=args.quality
+        )
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,149 @@
+import os
+import json
+import sqlite3
+import logging
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from paths import state_dir
+
+try:
+    import av
+except ImportError:  # 沒有 PyAV 時退回 ffprobe
+    av = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm", ".mp3", ".m4a", ".wav", ".aac", ".flac")
+
+
+class ProbeError(Exception):
+    """無法讀取媒體檔資訊"""
+
+
+def _probe_with_av(path: str) -> Dict:
+    """以 PyAV 在本行程內讀取容器資訊（只讀 header，不解碼）"""
+    with av.open(path) as container:
+        streams = []
+        for s in container.streams:
+            ctx = s.codec_context
+            info = {'type': s.type, 'codec': ctx.name if ctx else None}
+            if s.type == 'audio':
+                info.update(sample_rate=ctx.sample_rate, channels=ctx.channels)
+            elif s.type == 'video':
+                info.update(width=ctx.width, height=ctx.height)
+            streams.append(info)
+        duration = container.duration / av.time_base if container.duration else None
+        if duration is None:
+            # 部分容器只在 stream 上標示時長
+            durations = [float(s.duration * s.time_base) for s in container.streams if s.duration]
+            duration = max(durations) if durations else None
+        return {
+            'format': container.format.name,
+            'duration': duration,
+            'bit_rate': container.bit_rate,
+            'streams': streams,
+        }
+
+
+def _probe_with_ffprobe(path: str) -> Dict:
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout)
+    streams = []
+    for s in data.get('streams', []):
+        info = {'type': s.get('codec_type'), 'codec': s.get('codec_name')}
+        if info['type'] == 'audio':
+            info.update(sample_rate=int(s.get('sample_rate', 0)) or None, channels=s.get('channels'))
+        elif info['type'] == 'video':
+            info.update(width=s.get('width'), height=s.get('height'))
+        streams.append(info)
+    fmt = data.get('format', {})
+    return {
+        'format': fmt.get('format_name'),
+        'duration': float(fmt['duration']) if fmt.get('duration') else None,
+        'bit_rate': int(fmt['bit_rate']) if fmt.get('bit_rate') else None,
+        'streams': streams,
+    }
+
+
+class MediaProbe:
+    """媒體檔資訊快取：以 (路徑, 大小, mtime) 為 key，檔案沒變就不重新讀取"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(state_dir() / "probes.sqlite3")
+        self._lock = threading.Lock()
+        self._memory: Dict[tuple, Dict] = {}
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " path TEXT, size INTEGER, mtime_ns INTEGER, info TEXT,"
+                " PRIMARY KEY (path, size, mtime_ns))"
+            )
+
+    def probe(self, path) -> Dict:
+        """回傳媒體資訊：format、duration（秒）、bit_rate、streams"""
+        path = os.path.abspath(str(path))
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise ProbeError(f"找不到媒體檔: {path}") from e
+        key = (path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            row = self._conn.execute(
+                "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?", key).fetchone()
+        if row:
+            info = json.loads(row[0])
+        else:
+            try:
+                info = _probe_with_av(path) if av else _probe_with_ffprobe(path)
+            except Exception as e:
+                raise ProbeError(f"無法讀取媒體資訊 {path}: {e}") from e
+            with self._lock, self._conn:
+                # 同一路徑的舊版本資訊已無用，一併清除
+                self._conn.execute("DELETE FROM probes WHERE path = ?", (path,))
+                self._conn.execute("INSERT INTO probes VALUES (?, ?, ?, ?)", key + (json.dumps(info),))
+        with self._lock:
+            self._memory[key] = info
+        return info
+
+    def duration(self, path) -> Optional[float]:
+        return self.probe(path).get('duration')
+
+    def scan_directory(self, directory, extensions: Iterable[str] = MEDIA_EXTENSIONS) -> Dict[str, Dict]:
+        """批次掃描資料夾：每個媒體檔最多讀取一次（未變動的檔案直接用快取）"""
+        results = {}
+        for entry in sorted(Path(directory).iterdir()):
+            if entry.is_file() and entry.suffix.lower() in extensions:
+                try:
+                    results[str(entry)] = self.probe(entry)
+                except ProbeError as e:
+                    logger.warning(str(e))
+        return results
+
+
+def audio_stream(info: Dict) -> Optional[Dict]:
+    """第一個音訊串流的資訊"""
+    return next((s for s in info.get('streams', []) if s.get('type') == 'audio'), None)
+
+
+def has_video(info: Dict) -> bool:
+    return any(s.get('type') == 'video' for s in info.get('streams', []))
+
+
+_probe = None
+_probe_lock = threading.Lock()
+
+
+def get_media_probe() -> MediaProbe:
+    """本行程共用的 MediaProbe"""
+    global _probe
+    with _probe_lock:
+        if _probe is None:
+            _probe = MediaProbe()
+        return _probe
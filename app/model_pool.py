@@ -0,0 +1,116 @@
+import gc
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from engines import TranscriptionEngine, get_engine
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """解析記憶體大小設定，例如 '8G'、'512M'"""
+    text = text.strip().upper().rstrip('B')
+    unit = text[-1] if text and text[-1] in _UNITS else ''
+    return int(float(text[:-1] if unit else text) * _UNITS[unit])
+
+
+def _default_budget() -> int:
+    """預設使用實體記憶體的一半；無法取得時為 8 GB"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (AttributeError, ValueError, OSError):
+        return 8 * 1024 ** 3
+
+
+class ModelPool:
+    """常駐的 Whisper 模型池：同一行程內重複使用已載入的模型，超過記憶體預算時淘汰最久未用的
+
+    以「引擎:模型」為鍵，同一模型在不同引擎下分開常駐。
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        self.budget = budget_bytes or _default_budget()
+        self._models: "OrderedDict[str, object]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def _evict_until(self, needed: int, keep: Optional[str] = None) -> None:
+        """淘汰最久未使用的模型，直到常駐量 + needed 不超過預算"""
+        for name in list(self._models):
+            if self.resident_bytes + needed <= self.budget:
+                break
+            if name == keep:
+                continue
+            logger.info(f"Evicting Whisper model ({name}, {self._sizes[name] / 1024 ** 2:.0f} MB)")
+            del self._models[name]
+            del self._sizes[name]
+            self.evictions += 1
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def get(self, name: str, engine: Optional[TranscriptionEngine] = None):
+        """取得模型；已常駐則直接回傳，否則載入（必要時先淘汰其他模型）"""
+        engine = engine or get_engine()
+        key = f"{engine.name}:{name}"
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                logger.info(f"Whisper model ({key}) already resident, skipping load")
+                return self._models[key]
+            self.misses += 1
+            self._evict_until(engine.estimate_bytes(name))
+            logger.info(f"Loading Whisper model ({key})...")
+            start = time.time()
+            model = engine.load(name)
+            elapsed = time.time() - start
+            self.load_seconds += elapsed
+            self._models[key] = model
+            self._sizes[key] = engine.model_bytes(name, model)
+            logger.info(f"Loaded Whisper model ({key}) in {elapsed:.1f}s, "
+                        f"{self._sizes[key] / 1024 ** 2:.0f} MB")
+            # 實際大小可能超過預估，再檢查一次（不淘汰剛載入的模型）
+            self._evict_until(0, keep=key)
+            return model
+
+    def report(self) -> str:
+        """載入時間、命中率與常駐大小"""
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return (f"Whisper model pool: {len(self._models)} resident "
+                f"({self.resident_bytes / 1024 ** 2:.0f} MB / budget {self.budget / 1024 ** 2:.0f} MB), "
+                f"hit rate {hit_rate:.0f}% ({self.hits}/{total}), "
+                f"total load time {self.load_seconds:.1f}s, evictions {self.evictions}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    """本行程共用的模型池；預算可由 VIDEO2SUM_MODEL_RAM_BUDGET 設定（如 8G）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            budget = os.getenv("VIDEO2SUM_MODEL_RAM_BUDGET", "").strip()
+            _pool = ModelPool(parse_size(budget) if budget else None)
+        return _pool
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import logging
+import argparse
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from audio_decode import SAMPLE_RATE
+from engines import ENGINES, MODEL_PARAMS, get_engine
+from model_pool import parse_size
+from paths import state_dir
+
+logger = logging.getLogger(__name__)
+
+# 校正時預設取音訊開頭這麼多秒
+DEFAULT_SAMPLE_SECONDS = 120
+# 由快到慢，也是由準確度低到高
+MODEL_ORDER = list(MODEL_PARAMS)
+
+
+def profile_path() -> Path:
+    return state_dir() / "model_profile.json"
+
+
+def parse_duration(text: str) -> float:
+    """解析時間設定，例如 '90'（秒）、'45m'、'1.5h'"""
+    text = text.strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def _peak_rss() -> int:
+    """本行程的記憶體使用峰值（bytes）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 為單位，macOS 以 bytes 為單位
+        return peak if platform.system() == 'Darwin' else peak * 1024
+    except ImportError:  # Windows
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+
+
+def _measure(engine_name: str, model_name: str, audio: np.ndarray, language: str) -> Dict:
+    """在獨立子行程中載入並轉錄一次，峰值記憶體才不會受其他模型影響"""
+    engine = get_engine(engine_name)
+    start = time.time()
+    model = engine.load(model_name)
+    load_seconds = time.time() - start
+    start = time.time()
+    engine.transcribe(model, audio, language, verbose=False)
+    seconds = time.time() - start
+    return {
+        'rtf': seconds / (len(audio) / SAMPLE_RATE),
+        'load_seconds': load_seconds,
+        'peak_rss': _peak_rss(),
+        'sample_seconds': len(audio) / SAMPLE_RATE,
+        'measured_at': time.time(),
+    }
+
+
+def load_profile() -> Dict:
+    path = profile_path()
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except json.JSONDecodeError:
+        return {}
+
+
+def calibrate(audio: np.ndarray, language: str, engine_name: str, models=None,
+              download: bool = False) -> Dict:
+    """量測本機每個已安裝模型的 RTF 與峰值記憶體，寫入模型效能檔並回傳該引擎的結果"""
+    engine = get_engine(engine_name)
+    profile = load_profile()
+    results = profile.setdefault('engines', {}).setdefault(engine.name, {})
+    context = multiprocessing.get_context('spawn')
+    for name in models or MODEL_ORDER:
+        if not download and not engine.installed(name):
+            logger.info(f"Skipping {engine.name}:{name} (not installed, use --download to fetch it)")
+            continue
+        logger.info(f"Calibrating {engine.name}:{name} on {len(audio) / SAMPLE_RATE:.0f}s of audio...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(_measure, engine.name, name, audio, language).result()
+        logger.info(f"{engine.name}:{name}: RTF {results[name]['rtf']:.3f}, "
+                    f"peak RSS {results[name]['peak_rss'] / 1024 ** 2:.0f} MB")
+    profile['host'] = platform.node()
+    profile['cpus'] = os.cpu_count()
+    profile_path().write_text(json.dumps(profile, indent=2), encoding='utf-8')
+    return results
+
+
+def predict_seconds(entry: Dict, duration: float) -> float:
+    return entry['load_seconds'] + entry['rtf'] * duration
+
+
+def choose_model(duration: float, deadline: Optional[float] = None, memory_cap: Optional[int] = None,
+                 engine_name: Optional[str] = None) -> Optional[Tuple[str, float]]:
+    """依模型效能檔挑出在期限與記憶體上限內最準確的模型，回傳 (模型, 預估秒數)
+
+    沒有效能檔時回傳 None；沒有任何模型符合條件時退回預估最快的模型。
+    時長不明（0）時只以記憶體上限篩選。
+    """
+    engine = get_engine(engine_name)
+    entries = load_profile().get('engines', {}).get(engine.name, {})
+    if not entries:
+        return None
+    candidates = [name for name in MODEL_ORDER if name in entries]
+    fitting = [name for name in candidates
+               if (memory_cap is None or entries[name]['peak_rss'] <= memory_cap)
+               and (deadline is None or not duration or predict_seconds(entries[name], duration) <= deadline)]
+    if fitting:
+        name = fitting[-1]
+    else:
+        name = min(candidates, key=lambda n: predict_seconds(entries[n], duration))
+        logger.warning(f"No Whisper model fits the deadline/memory cap, falling back to the fastest ({name})")
+    return name, predict_seconds(entries[name], duration)
+
+
+def _print_profile() -> None:
+    profile = load_profile()
+    if not profile:
+        print(f"尚未校正，請先執行 calibrate（效能檔位置：{profile_path()}）")
+        return
+    print(f"主機 {profile.get('host')}，{profile.get('cpus')} CPUs")
+    for engine_name, entries in profile.get('engines', {}).items():
+        print(f"\n{engine_name}")
+        print(f"{'model':<10}{'RTF':>8}{'load':>8}{'peak RSS':>12}{'1h video':>10}")
+        for name in MODEL_ORDER:
+            if name in entries:
+                e = entries[name]
+                print(f"{name:<10}{e['rtf']:>8.3f}{e['load_seconds']:>7.1f}s"
+                      f"{e['peak_rss'] / 1024 ** 2:>9.0f} MB{predict_seconds(e, 3600) / 60:>8.1f}m")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whisper 模型效能校正與自動選擇')
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help='量測本機各模型的 RTF 與峰值記憶體')
+    cal.add_argument('audio', help='校正用的音訊或影片檔')
+    cal.add_argument('--seconds', type=float, default=DEFAULT_SAMPLE_SECONDS,
+                     help=f'取開頭多少秒量測 (預設: {DEFAULT_SAMPLE_SECONDS})')
+    cal.add_argument('--language', default='en', help='語言 (預設: en)')
+    cal.add_argument('--engine', default=None, choices=list(ENGINES),
+                     help='轉錄引擎 (預設: VIDEO2SUM_WHISPER_ENGINE 或 whisper)')
+    cal.add_argument('--models', nargs='+', choices=MODEL_ORDER, help='只校正指定模型')
+    cal.add_argument('--download', action='store_true', help='未安裝的模型也下載後校正')
+    sub.add_parser('show', help='列出目前的模型效能檔')
+    choose = sub.add_parser('choose', help='依影片時長試算會選用的模型')
+    choose.add_argument('duration', type=parse_duration, help='影片時長，例如 3600、90m')
+    choose.add_argument('--deadline', type=parse_duration, help='轉錄期限，例如 30m')
+    choose.add_argument('--memory-cap', type=parse_size, help='記憶體上限，例如 4G')
+    choose.add_argument('--engine', default=None, choices=list(ENGINES))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'calibrate':
+        from audio_decode import decode_pcm
+        audio = np.array(decode_pcm(args.audio)[:int(args.seconds * SAMPLE_RATE)])
+        calibrate(audio, args.language, args.engine, args.models, args.download)
+        _print_profile()
+    elif args.command == 'show':
+        _print_profile()
+    else:
+        chosen = choose_model(args.duration, args.deadline, args.memory_cap, args.engine)
+        if not chosen:
+            print("尚未校正，請先執行 calibrate")
+        else:
+            print(f"選用 {chosen[0]}，預估轉錄 {chosen[1] / 60:.1f} 分鐘")
+
+
+if __name__ == '__main__':
+    main()
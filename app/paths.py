@@ -0,0 +1,72 @@
+import os
+import time
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def state_dir(*parts: str) -> Path:
+    """程式內部狀態（快取、協調檔）的根目錄：<VIDEO_BASE>/.video2sum
+
+    以 . 開頭，分類選單會自動略過；放在 Media_Notes 底下，Docker 掛載後同一台主機的
+    多個工作都能共用。可用 VIDEO2SUM_STATE_DIR 覆寫。
+    """
+    root = os.getenv("VIDEO2SUM_STATE_DIR") or os.path.join(os.getenv("VIDEO_BASE", "Media_Notes"), ".video2sum")
+    path = Path(root).joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@contextmanager
+def file_lock(path: str, remove: bool = False):
+    """跨行程的檔案鎖；remove=True 時釋放前刪除鎖檔（僅 POSIX），適合每個鍵各一個的短暫鎖"""
+    remove = remove and fcntl is not None
+    while True:
+        f = open(path, 'a+')
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        if not remove:
+            break
+        # 等待期間鎖檔可能已被前一個持有者刪除（或換成新檔），此時鎖住的是舊檔，需重新開啟
+        try:
+            if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    try:
+        yield
+    finally:
+        if remove:
+            os.unlink(path)
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        f.close()
+
+
+def place_srt(srt_path: Path, output_srt: Path) -> Path:
+    """把 SRT 移到輸出資料夾；目標已有其他 SRT 時先備份。已在目標位置時不動，回傳最終路徑"""
+    srt_path, output_srt = Path(srt_path), Path(output_srt)
+    output_srt.parent.mkdir(parents=True, exist_ok=True)
+    if output_srt.exists() and output_srt.resolve() == srt_path.resolve():
+        return output_srt
+    if output_srt.exists():
+        backup_path = output_srt.with_suffix(f".srt.bak_{int(time.time())}")
+        output_srt.rename(backup_path)
+        print(f"⚠️  目標 SRT 已存在，已自動備份為 {backup_path}")
+    # 使用移動，更有效率且避免重複檔案
+    shutil.move(str(srt_path), str(output_srt))
+    print(f"✅ 已將 {srt_path} 移動到 {output_srt}")
+    return output_srt
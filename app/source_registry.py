@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import urllib.parse
+from pathlib import Path
+from typing import Dict, Optional
+
+from paths import state_dir
+
+logger = logging.getLogger(__name__)
+
+# 完成此階段才算處理完畢，可以直接回傳既有產出
+FINAL_STAGE = "summarize"
+# 正規化網址時移除的追蹤參數
+TRACKING_PARAMS = {'si', 'feature', 'pp', 't', 'start', 'fbclid', 'gclid'}
+
+
+def normalize_url(url: str) -> str:
+    """同一部影片的不同寫法（youtu.be、www、追蹤參數、#片段）正規化為同一個網址"""
+    parsed = urllib.parse.urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    path = parsed.path.rstrip('/')
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parsed.query)
+             if k not in TRACKING_PARAMS and not k.startswith('utm_')]
+    if host == 'youtu.be':
+        host, query = 'youtube.com', [('v', path.lstrip('/'))]
+        path = '/watch'
+    elif host == 'youtube.com' and path.startswith('/shorts/'):
+        query = [('v', path.split('/')[2])]
+        path = '/watch'
+    elif host == 'youtube.com' and path == '/watch':
+        # 影片頁只看 v，播放清單位置等參數不影響內容
+        query = [(k, v) for k, v in query if k == 'v']
+    return urllib.parse.urlunparse(('https', host, path, '', urllib.parse.urlencode(sorted(query)), ''))
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SourceRegistry:
+    """已處理來源的登記表（SQLite）：來源鍵 → 產出路徑、已完成階段與產出檔的 SHA-256
+
+    來源鍵為 GDC ID、正規化後的網址或本地檔案內容雜湊，不依賴會互相碰撞的影片標題。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(state_dir() / "sources.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources ("
+                " key TEXT PRIMARY KEY,"
+                " source TEXT NOT NULL,"
+                " output_dir TEXT,"
+                " stages TEXT NOT NULL,"
+                " artifacts TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            # 各階段產出時的設定（如摘要使用的 Gemini 模型與 prompt 版本）；舊資料庫補上此欄
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sources)")]
+            if 'params' not in columns:
+                self._conn.execute("ALTER TABLE sources ADD COLUMN params TEXT NOT NULL DEFAULT '{}'")
+            # 本地檔案的雜湊以路徑、大小與修改時間快取，重複提交時不必重讀整個檔案
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " sha256 TEXT NOT NULL)"
+            )
+
+    def file_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        digest = _sha256_file(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def source_key(self, source: str) -> str:
+        """GDC ID、正規化網址或本地檔案內容雜湊"""
+        if source.startswith(('http://', 'https://')):
+            m = re.search(r'gdcvault\.com/play/(\d+)', source)
+            return f"gdc:{m.group(1)}" if m else f"url:{normalize_url(source)}"
+        return f"file:{self.file_hash(source)}"
+
+    def _get(self, key: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT source, output_dir, stages, artifacts, updated_at, params FROM sources WHERE key = ?",
+            (key,)).fetchone()
+        if not row:
+            return None
+        return {'key': key, 'source': row[0], 'output_dir': row[1], 'stages': json.loads(row[2]),
+                'artifacts': json.loads(row[3]), 'updated_at': row[4], 'params': json.loads(row[5])}
+
+    def record(self, key: str, source: str, stage: str, output_dir: Optional[Path] = None,
+               params: Optional[Dict] = None, **artifacts: Path) -> None:
+        """記錄某階段完成，連同該階段的設定、產出檔路徑與 SHA-256"""
+        with self._lock, self._conn:
+            entry = self._get(key) or {'stages': {}, 'artifacts': {}, 'output_dir': None, 'params': {}}
+            entry['stages'][stage] = time.time()
+            if params is not None:
+                entry['params'][stage] = params
+            for name, path in artifacts.items():
+                entry['artifacts'][name] = {'path': str(path), 'sha256': _sha256_file(str(path))}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (key, source, output_dir, stages, artifacts, updated_at, params)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, source, str(output_dir) if output_dir else entry['output_dir'],
+                 json.dumps(entry['stages']), json.dumps(entry['artifacts']), time.time(),
+                 json.dumps(entry['params'])))
+
+    def lookup(self, key: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """已完整處理且產出檔都還在時回傳登記資料；否則回傳 None
+
+        指定 params 時，最後階段須以相同設定（如 Gemini 模型與 prompt 版本）完成，否則視為未處理。
+        產出檔內容與登記的 SHA-256 不同（例如在 Obsidian 裡編輯過筆記）時仍視為已處理，
+        列在 entry['modified']，避免重跑覆蓋使用者的修改。
+        """
+        with self._lock:
+            entry = self._get(key)
+        if not entry or FINAL_STAGE not in entry['stages']:
+            return None
+        if params is not None and entry['params'].get(FINAL_STAGE) != params:
+            logger.info(f"{key} was summarized with {entry['params'].get(FINAL_STAGE)}, now {params}; "
+                        f"summarizing again")
+            return None
+        entry['modified'] = []
+        for name, artifact in entry['artifacts'].items():
+            path = artifact['path']
+            if not os.path.exists(path):
+                return None
+            if _sha256_file(path) != artifact['sha256']:
+                entry['modified'].append(name)
+        return entry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_source_registry() -> SourceRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SourceRegistry()
+        return _registry
@@ -0,0 +1,63 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Optional
+
+from paths import state_dir
+
+# 解析結果預設保留 24 小時（串流網址常帶有會過期的簽章）
+DEFAULT_TTL = 24 * 3600
+
+
+class StreamCache:
+    """已解析串流網址的持久快取（SQLite），以 GDC ID 或頁面網址為 key"""
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path or str(state_dir() / "streams.sqlite3")
+        if ttl is None:
+            ttl = float(os.getenv("VIDEO2SUM_STREAM_CACHE_TTL", DEFAULT_TTL))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS streams ("
+                " key TEXT PRIMARY KEY,"
+                " urls TEXT NOT NULL,"
+                " resolved_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(page_url: str, gdc_id: Optional[str]) -> str:
+        return f"gdc:{gdc_id}" if gdc_id else f"url:{page_url}"
+
+    def get(self, key: str) -> List[str]:
+        """回傳未過期的快取網址；過期項目順便刪除"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT urls, resolved_at FROM streams WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return []
+            if time.time() - row[1] > self.ttl:
+                with self._conn:
+                    self._conn.execute("DELETE FROM streams WHERE key = ?", (key,))
+                return []
+            return json.loads(row[0])
+
+    def put(self, key: str, urls: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO streams (key, urls, resolved_at) VALUES (?, ?, ?)",
+                (key, json.dumps(urls), time.time()))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM streams WHERE key = ?", (key,))
+
+    def invalidate_stream(self, stream_url: str) -> None:
+        """刪除所有包含此串流網址的項目（下載時遇到 403/404 使用）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM streams WHERE instr(urls, ?) > 0", (json.dumps(stream_url)[1:-1],))
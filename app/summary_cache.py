@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from paths import state_dir, file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache:
+    """Gemini 摘要回應的持久快取（SQLite），並合併同時送出的相同請求（single-flight）
+
+    同一行程內的相同請求只有第一個呼叫 API，其餘等待其結果；跨行程以檔案鎖協調，
+    取得鎖後先重查快取，所以同一台主機上相同的請求只會送出一次。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(state_dir() / "summaries.sqlite3")
+        self.lock_dir = state_dir("summary_locks")
+        self._lock = threading.Lock()
+        # 每個鍵一把鎖與等待中的呼叫端數
+        self._inflight: Dict[str, list] = {}
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(transcript: str, model: str, generation_config: Dict, prompt_version: int,
+                 video_url: str = '') -> str:
+        """逐字稿雜湊 + 模型 + 生成參數 + prompt 範本版本；影片網址也會寫進 prompt，一併納入"""
+        h = hashlib.sha256(transcript.encode('utf-8'))
+        h.update(json.dumps([model, generation_config, prompt_version, video_url], sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, model: str, response: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time()))
+
+    def get_or_generate(self, key: str, model: str, generate: Callable[[], str], refresh: bool = False) -> str:
+        """有快取直接回傳；否則只讓一個呼叫端執行 generate，其他相同請求等待並共用結果
+
+        refresh=True 時不讀取快取，重新產生並覆寫原本的項目。
+        """
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                logger.info(f"Gemini summary cache hit ({key[:12]})")
+                return cached
+        with self._lock:
+            inflight = self._inflight.setdefault(key, [threading.Lock(), 0])
+            inflight[1] += 1
+        try:
+            with inflight[0], file_lock(str(self.lock_dir / f"{key}.lock"), remove=True):
+                cached = None if refresh else self.get(key)
+                if cached is not None:
+                    logger.info(f"Gemini summary produced by a concurrent request, reusing it ({key[:12]})")
+                    return cached
+                response = generate()
+                self.put(key, model, response)
+                return response
+        finally:
+            # 沒有其他呼叫端在等待同一個鍵時移除，長時間執行的批次不會累積
+            with self._lock:
+                inflight[1] -= 1
+                if not inflight[1]:
+                    del self._inflight[key]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> Optional[SummaryCache]:
+    """本行程共用的摘要快取；VIDEO2SUM_SUMMARY_CACHE=0 時停用"""
+    global _cache
+    if os.getenv("VIDEO2SUM_SUMMARY_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+        return _cache
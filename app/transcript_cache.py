@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from audio_decode import SAMPLE_RATE
+from model_pool import parse_size
+from paths import state_dir
+
+logger = logging.getLogger(__name__)
+
+# 預設最多保留 512 MB 的逐字稿
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def hash_audio(audio: np.ndarray) -> str:
+    """解碼後 PCM 內容的 SHA-256；分批讀取，memmap 不會一次載入整段"""
+    h = hashlib.sha256()
+    block = SAMPLE_RATE * 60  # 每批 1 分鐘
+    for i in range(0, len(audio), block):
+        h.update(np.ascontiguousarray(audio[i:i + block], dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """以音訊內容雜湊 + 模型 + 引擎 + 語言為鍵的逐字稿快取（SQLite）
+
+    保存字幕段落與產出的 SRT；總大小超過上限時淘汰最久未使用的項目。
+    命中與未命中次數也存在同一個資料庫，同一台主機的所有工作共用。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or str(state_dir() / "transcripts.sqlite3")
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                " key TEXT PRIMARY KEY,"
+                " segments TEXT NOT NULL,"
+                " srt TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # 來源（GDC ID、正規化網址）最近一次下載到的音訊雜湊，下載前就能判斷是否已有逐字稿
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, audio_hash TEXT NOT NULL)")
+
+    @staticmethod
+    def make_key(audio_hash: str, model: str, engine: str, language: str) -> str:
+        return f"{audio_hash}:{engine}:{model}:{language}"
+
+    def _count(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key: str) -> Optional[Dict]:
+        """回傳 {'segments': [...], 'srt': str}；命中時更新最近使用時間"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT segments, srt FROM transcripts WHERE key = ?", (key,)).fetchone()
+            self._count('hits' if row else 'misses')
+            if not row:
+                return None
+            self._conn.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+            return {'segments': json.loads(row[0]), 'srt': row[1]}
+
+    def put(self, key: str, segments: List[Dict], srt: str, source: Optional[str] = None) -> None:
+        data = json.dumps(segments, ensure_ascii=False)
+        size = len(data.encode('utf-8')) + len(srt.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (key, segments, srt, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, srt, size, time.time()))
+            if source:
+                self._conn.execute("INSERT OR REPLACE INTO sources (source, audio_hash) VALUES (?, ?)",
+                                   (source, key.split(':', 1)[0]))
+            self._evict()
+
+    def has_source(self, source: str, model: str, engine: str, language: str) -> bool:
+        """此來源上次下載到的音訊是否已有相同模型、引擎與語言的逐字稿（不計入命中率）"""
+        with self._lock:
+            row = self._conn.execute("SELECT audio_hash FROM sources WHERE source = ?", (source,)).fetchone()
+            if not row:
+                return False
+            key = self.make_key(row[0], model, engine, language)
+            return self._conn.execute("SELECT 1 FROM transcripts WHERE key = ?", (key,)).fetchone() is not None
+
+    def _evict(self) -> None:
+        """刪除最久未使用的項目，直到總大小不超過上限"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM transcripts ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            total -= size
+            self._count('evictions')
+            logger.info(f"Evicted cached transcript {key[:16]}... ({size / 1024:.0f} KB)")
+
+    def report(self) -> str:
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+        hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+        lookups = hits + misses
+        hit_rate = hits / lookups * 100 if lookups else 0.0
+        return (f"Transcript cache: {count} entries ({total / 1024 ** 2:.1f} MB / "
+                f"{self.max_bytes / 1024 ** 2:.0f} MB), hit rate {hit_rate:.0f}% ({hits}/{lookups}), "
+                f"evictions {stats.get('evictions', 0)}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> Optional[TranscriptCache]:
+    """本行程共用的逐字稿快取；容量由 VIDEO2SUM_TRANSCRIPT_CACHE_SIZE 設定（如 1G），設為 0 時停用"""
+    global _cache
+    size = os.getenv("VIDEO2SUM_TRANSCRIPT_CACHE_SIZE", "").strip()
+    max_bytes = parse_size(size) if size else None
+    if max_bytes == 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache(max_bytes=max_bytes)
+        return _cache
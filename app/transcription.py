@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_decode import SAMPLE_RATE, PCMStream
+from engines import ENGINES, TranscriptionEngine, get_engine
+
+logger = logging.getLogger(__name__)
+
+# 平行轉錄：每段目標長度、相鄰段重疊秒數、在目標點前後尋找靜音的範圍
+DEFAULT_CHUNK_SECONDS = 10 * 60
+DEFAULT_OVERLAP_SECONDS = 2.0
+SILENCE_SEARCH_SECONDS = 30.0
+ENERGY_FRAME_SECONDS = 0.1
+# 邊下載邊轉錄：每緩衝滿此秒數就送出一個視窗
+STREAM_WINDOW_SECONDS = 2 * 60
+# 檢查點：每個視窗的目標長度，以及傳給下一個視窗的前文字數
+CHECKPOINT_WINDOW_SECONDS = 5 * 60
+PROMPT_CHARS = 200
+
+
+def transcribe_serial(model, audio: np.ndarray, language: str, verbose: bool = True,
+                      engine: Optional[TranscriptionEngine] = None, prompt: Optional[str] = None) -> Dict:
+    """單一次完整轉錄（原本的路徑）"""
+    return (engine or get_engine()).transcribe(model, audio, language, verbose=verbose, prompt=prompt)
+
+
+def checkpoint_enabled() -> bool:
+    """檢查點會把音訊切成約 5 分鐘的視窗，跨視窗只以前文提示銜接，辨識結果可能與一次轉錄不同，
+    因此預設關閉，需設定 VIDEO2SUM_CHECKPOINT=1 啟用"""
+    return os.getenv("VIDEO2SUM_CHECKPOINT", "").strip().lower() in ("1", "true", "yes", "y")
+
+
+def transcribe_workers() -> int:
+    """VIDEO2SUM_TRANSCRIBE_WORKERS；未設定或格式錯誤時為 1（單一行程轉錄）"""
+    value = os.getenv("VIDEO2SUM_TRANSCRIBE_WORKERS", "").strip()
+    if not value:
+        return 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning(f"Invalid VIDEO2SUM_TRANSCRIBE_WORKERS={value!r}, transcribing in a single process")
+        return 1
+
+
+def audio_key(audio: np.ndarray) -> str:
+    """音訊識別碼：長度加上每秒取一個樣本的雜湊，不必讀完整段 memmap"""
+    h = hashlib.sha1(str(len(audio)).encode('utf-8'))
+    h.update(np.ascontiguousarray(audio[::SAMPLE_RATE], dtype=np.float32).tobytes())
+    return h.hexdigest()[:16]
+
+
+def frame_energy(audio: np.ndarray, frame_seconds: float = ENERGY_FRAME_SECONDS) -> np.ndarray:
+    """每個音框的 RMS 能量；分批計算，長音訊（memmap）也不會一次配置整段"""
+    frame = int(SAMPLE_RATE * frame_seconds)
+    n_frames = len(audio) // frame
+    energy = np.empty(n_frames, dtype=np.float32)
+    block = 600  # 每批 600 個音框（約 1 分鐘）
+    for i in range(0, n_frames, block):
+        j = min(i + block, n_frames)
+        frames = np.asarray(audio[i * frame:j * frame], dtype=np.float32).reshape(j - i, frame)
+        energy[i:j] = np.sqrt(np.mean(frames ** 2, axis=1))
+    return energy
+
+
+def silence_split_points(audio: np.ndarray, chunk_seconds: float) -> List[float]:
+    """在每個目標長度附近找能量最低的時間點作為切點（秒）"""
+    energy = frame_energy(audio)
+    duration = len(audio) / SAMPLE_RATE
+    points = []
+    previous = 0.0
+    target = chunk_seconds
+    # 剩下不到四分之一段時不再切
+    while target < duration - chunk_seconds / 4:
+        # 搜尋範圍不早於上一個切點後半段，確保每段都有一定長度
+        earliest = max(target - SILENCE_SEARCH_SECONDS, previous + chunk_seconds / 2)
+        lo = int(earliest / ENERGY_FRAME_SECONDS)
+        hi = min(len(energy), int((target + SILENCE_SEARCH_SECONDS) / ENERGY_FRAME_SECONDS))
+        if hi <= lo:
+            break
+        point = (lo + int(np.argmin(energy[lo:hi])) + 0.5) * ENERGY_FRAME_SECONDS
+        points.append(point)
+        previous = point
+        target = point + chunk_seconds
+    return points
+
+
+# --- 子行程 ---------------------------------------------------------------
+
+_worker_model = None
+_worker_engine = None
+
+
+def _init_worker(engine_name: str, model_name: str, threads: int) -> None:
+    """每個子行程固定執行緒數並各自載入一次模型"""
+    global _worker_model, _worker_engine
+    _worker_engine = get_engine(engine_name)
+    _worker_model = _worker_engine.load(model_name, threads=threads)
+
+
+def _transcribe_chunk(args: Tuple[np.ndarray, float, str]) -> List[Dict]:
+    audio, offset, language = args
+    result = transcribe_serial(_worker_model, audio, language, verbose=False, engine=_worker_engine)
+    return [{'start': seg['start'] + offset, 'end': seg['end'] + offset, 'text': seg['text']}
+            for seg in result['segments']]
+
+
+# --------------------------------------------------------------------------
+
+
+def transcribe_streaming(stream: PCMStream, model, language: str,
+                         on_segments: Callable[[List[Dict]], None],
+                         window_seconds: float = STREAM_WINDOW_SECONDS,
+                         engine: Optional[TranscriptionEngine] = None) -> Dict:
+    """來源仍在下載時逐窗轉錄，每個視窗的結果立即交給 on_segments
+
+    緩衝滿一個視窗後，在視窗尾端 SILENCE_SEARCH_SECONDS 內能量最低處切開，避免句子被截斷；
+    來源結束後轉錄剩下的音訊。回傳格式與 model.transcribe 相同。
+    """
+    engine = engine or get_engine()
+    window = int(window_seconds * SAMPLE_RATE)
+    search = int(min(SILENCE_SEARCH_SECONDS, window_seconds / 2) * SAMPLE_RATE)
+    frame = int(SAMPLE_RATE * ENERGY_FRAME_SECONDS)
+    segments: List[Dict] = []
+    start = 0
+    while True:
+        available = stream.wait_for(start + window)
+        if stream.error:
+            raise RuntimeError(stream.error)
+        final = stream.done and available - start <= window
+        if final:
+            end = available
+        else:
+            energy = frame_energy(stream.view(start + window - search, start + window))
+            end = start + window - search + int((int(np.argmin(energy)) + 0.5) * frame)
+        offset, limit = start / SAMPLE_RATE, end / SAMPLE_RATE
+        if end - start >= SAMPLE_RATE:
+            result = transcribe_serial(model, stream.view(start, end), language, verbose=False, engine=engine)
+            chunk = [{'start': seg['start'] + offset, 'end': min(seg['end'] + offset, limit), 'text': seg['text']}
+                     for seg in result['segments']]
+            logger.info(f"Streaming window {offset:.0f}s-{limit:.0f}s: {len(chunk)} segments")
+            segments.extend(chunk)
+            on_segments(chunk)
+        start = end
+        if final:
+            break
+    return {'segments': segments, 'text': ''.join(s['text'] for s in segments), 'language': language}
+
+
+class TranscriptCheckpoint:
+    """轉錄檢查點：每完成一個視窗就 append 定稿的字幕段落、音訊位置與解碼上下文
+
+    第一行記錄模型、引擎、語言與音訊識別碼，任何一項不同即視為另一個工作，從頭開始。
+    """
+
+    def __init__(self, path: Path, params: Dict):
+        self.path = Path(path)
+        self.params = params
+        self.windows: List[Dict] = []
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            try:
+                header = json.loads(lines[0]) if lines else {}
+            except json.JSONDecodeError:
+                header = {}
+            if header.get('params') == params:
+                for line in lines[1:]:
+                    if not line.endswith("\n"):
+                        # 寫到一半被中斷的最後一行，直接忽略
+                        break
+                    try:
+                        self.windows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+                if len(self.windows) < len(lines) - 1:
+                    # 截掉不完整的部分再接續 append，否則之後的視窗會接在殘缺的位元組後面而無法讀回
+                    logger.info(f"Dropping a torn entry from transcription checkpoint {self.path}")
+                    self._rewrite()
+            else:
+                logger.info(f"Transcription checkpoint {self.path} belongs to another run, starting over")
+        if not self.windows:
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        """以標頭與目前的有效視窗重寫檢查點（先寫暫存檔再取代）"""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'params': self.params}) + "\n")
+            for window in self.windows:
+                f.write(json.dumps(window, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @property
+    def offset(self) -> int:
+        """已定稿的音訊位置（樣本數）"""
+        return self.windows[-1]['end'] if self.windows else 0
+
+    @property
+    def prompt(self) -> Optional[str]:
+        return self.windows[-1]['prompt'] if self.windows else None
+
+    @property
+    def segments(self) -> List[Dict]:
+        return [seg for window in self.windows for seg in window['segments']]
+
+    def record(self, end: int, segments: List[Dict], prompt: str) -> None:
+        entry = {'end': end, 'segments': segments, 'prompt': prompt}
+        self.windows.append(entry)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def cleanup(self) -> None:
+        """SRT 寫入成功後刪除檢查點"""
+        if self.path.exists():
+            self.path.unlink()
+
+
+def transcribe_checkpointed(model, audio: np.ndarray, language: str, checkpoint: TranscriptCheckpoint,
+                            window_seconds: float = CHECKPOINT_WINDOW_SECONDS, verbose: bool = True,
+                            engine: Optional[TranscriptionEngine] = None) -> Dict:
+    """在靜音處切成視窗依序轉錄，每個視窗完成就寫入檢查點；有檢查點時從最後定稿的位置接續
+
+    切點只由音訊決定，每個視窗都以前一個視窗的結尾文字作為前文，
+    因此中斷後接續與一次跑完的結果結構相同。
+    """
+    engine = engine or get_engine()
+    bounds = [0] + [int(p * SAMPLE_RATE) for p in silence_split_points(audio, window_seconds)] + [len(audio)]
+    segments = checkpoint.segments
+    prompt = checkpoint.prompt
+    if checkpoint.offset:
+        logger.info(f"Resuming transcription from checkpoint at {checkpoint.offset / SAMPLE_RATE:.0f}s "
+                    f"({len(segments)} segments already done)")
+    for start, end in zip(bounds, bounds[1:]):
+        if end <= checkpoint.offset:
+            continue
+        offset, limit = start / SAMPLE_RATE, end / SAMPLE_RATE
+        result = transcribe_serial(model, np.asarray(audio[start:end]), language, verbose=verbose,
+                                   engine=engine, prompt=prompt)
+        chunk = [{'start': seg['start'] + offset, 'end': min(seg['end'] + offset, limit), 'text': seg['text']}
+                 for seg in result['segments']]
+        prompt = ((prompt or '') + ''.join(seg['text'] for seg in chunk))[-PROMPT_CHARS:]
+        checkpoint.record(end, chunk, prompt)
+        segments.extend(chunk)
+    return {'segments': segments, 'text': ''.join(s['text'] for s in segments), 'language': language}
+
+
+# --------------------------------------------------------------------------
+
+
+def _same_text(a: str, b: str) -> bool:
+    a, b = a.strip().lower(), b.strip().lower()
+    return bool(a) and (a in b or b in a or SequenceMatcher(None, a, b).ratio() > 0.8)
+
+
+def merge_chunks(chunk_segments: List[List[Dict]], bounds: List[float]) -> List[Dict]:
+    """合併各段結果：前一段只保留在切點前開始的句子，並去除重疊區重複的句子"""
+    merged: List[Dict] = []
+    for i, segments in enumerate(chunk_segments):
+        if i + 1 < len(chunk_segments):
+            segments = [s for s in segments if s['start'] < bounds[i + 1]]
+        for seg in segments:
+            if merged and _same_text(merged[-1]['text'], seg['text']) and seg['start'] < merged[-1]['end']:
+                continue
+            if merged and merged[-1]['end'] > seg['start']:
+                # 避免字幕時間重疊
+                merged[-1]['end'] = seg['start']
+            merged.append(dict(seg))
+    return merged
+
+
+def transcribe_parallel(audio: np.ndarray, model_name: str, language: str, workers: int,
+                        chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+                        overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+                        threads_per_worker: Optional[int] = None,
+                        engine: Optional[TranscriptionEngine] = None) -> Dict:
+    """在靜音處切段，以多個 CPU 子行程平行轉錄，再合併成單一結果
+
+    每個子行程各自載入一份模型，記憶體需求約為 workers 倍。
+    回傳格式與 model.transcribe 相同（segments 內含 start/end/text）。
+    """
+    engine = engine or get_engine()
+    duration = len(audio) / SAMPLE_RATE
+    points = silence_split_points(audio, chunk_seconds)
+    bounds = [0.0] + points + [duration]
+    jobs = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        # 右側多帶一點重疊，讓切點前的最後一句能完整辨識
+        end = min(duration, end + overlap_seconds)
+        jobs.append((np.array(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]), start, language))
+    workers = max(1, min(workers, len(jobs)))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Parallel transcription ({engine.name}): {len(jobs)} chunks, "
+                f"{workers} workers x {threads} threads")
+    # 使用 spawn，避免在已初始化 torch 執行緒池的行程中 fork
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(engine.name, model_name, threads)) as pool:
+        chunk_segments = list(pool.map(_transcribe_chunk, jobs))
+    segments = merge_chunks(chunk_segments, bounds)
+    return {'segments': segments, 'text': ''.join(s['text'] for s in segments), 'language': language}
+
+
+def timing_deviation(reference: List[Dict], candidate: List[Dict]) -> Dict:
+    """比較兩份轉錄的時間碼：以文字相近的句子配對，回傳配對率與起始時間差"""
+    deltas = []
+    j = 0
+    for ref in reference:
+        # 只往後找幾句，兩份結果的句子順序一致
+        for k in range(j, min(j + 5, len(candidate))):
+            if _same_text(ref['text'], candidate[k]['text']):
+                deltas.append(abs(ref['start'] - candidate[k]['start']))
+                j = k + 1
+                break
+    if not deltas:
+        return {'matched': 0.0, 'median': None, 'p95': None, 'max': None}
+    deltas = np.array(deltas)
+    return {
+        'matched': len(deltas) / max(1, len(reference)),
+        'median': float(np.median(deltas)),
+        'p95': float(np.percentile(deltas, 95)),
+        'max': float(deltas.max()),
+    }
+
+
+def _benchmark_engines(audio: np.ndarray, args) -> None:
+    """各引擎依序轉錄同一段音訊，列出 RTF 並以第一個引擎為基準比對時間碼"""
+    duration = len(audio) / SAMPLE_RATE
+    reference = None
+    print(f"音訊長度 {duration:.0f}s，模型 {args.model}")
+    print(f"{'engine':<16}{'load':>8}{'transcribe':>12}{'RTF':>8}{'speedup':>9}")
+    for i, name in enumerate(args.engines):
+        engine = get_engine(name)
+        start = time.time()
+        model = engine.load(args.model)
+        load_seconds = time.time() - start
+        start = time.time()
+        result = transcribe_serial(model, audio, args.language, verbose=False, engine=engine)
+        seconds = time.time() - start
+        if reference is None:
+            reference = (result['segments'], seconds)
+        print(f"{name:<16}{load_seconds:>7.1f}s{seconds:>11.1f}s{seconds / duration:>8.3f}"
+              f"{reference[1] / seconds:>8.2f}x")
+        if i > 0:
+            deviation = timing_deviation(reference[0], result['segments'])
+            if deviation['median'] is not None:
+                print(f"{'':<16}句子配對率 {deviation['matched'] * 100:.1f}%，起始時間差 "
+                      f"median {deviation['median']:.2f}s p95 {deviation['p95']:.2f}s")
+        del model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whisper 轉錄效能比對工具（serial vs. parallel、各引擎 RTF）')
+    parser.add_argument('audio', help='音訊或影片檔')
+    parser.add_argument('--model', default='small', help='Whisper 模型 (預設: small)')
+    parser.add_argument('--language', default='en', help='語言 (預設: en)')
+    parser.add_argument('--engine', default=None, choices=list(ENGINES),
+                        help='serial/parallel 比對使用的引擎 (預設: VIDEO2SUM_WHISPER_ENGINE 或 whisper)')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES),
+                        help='改為比對多個引擎的 RTF，例如 --engines whisper faster-whisper')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                        help='平行轉錄的子行程數')
+    parser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help=f'每段目標長度 (預設: {DEFAULT_CHUNK_SECONDS})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from audio_decode import decode_pcm
+    audio = decode_pcm(args.audio)
+    duration = len(audio) / SAMPLE_RATE
+
+    if args.engines:
+        _benchmark_engines(audio, args)
+        return
+
+    engine = get_engine(args.engine)
+    start = time.time()
+    serial = transcribe_serial(engine.load(args.model), audio, args.language, verbose=False, engine=engine)
+    serial_seconds = time.time() - start
+
+    start = time.time()
+    parallel = transcribe_parallel(audio, args.model, args.language, args.workers, args.chunk_seconds,
+                                   engine=engine)
+    parallel_seconds = time.time() - start
+
+    deviation = timing_deviation(serial['segments'], parallel['segments'])
+    print(f"音訊長度 {duration:.0f}s（{engine.name}）")
+    print(f"serial:   {serial_seconds:.1f}s (RTF {serial_seconds / duration:.3f})")
+    print(f"parallel: {parallel_seconds:.1f}s (RTF {parallel_seconds / duration:.3f}, "
+          f"{serial_seconds / parallel_seconds:.2f}x)")
+    if deviation['median'] is not None:
+        print(f"句子配對率 {deviation['matched'] * 100:.1f}%，起始時間差 median {deviation['median']:.2f}s "
+              f"p95 {deviation['p95']:.2f}s max {deviation['max']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_decode import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# 以 30 ms 音框計算特徵
+FRAME_SECONDS = 0.03
+# 人聲頻帶；下限放到 80 Hz，低沉男聲的基頻與前幾個泛音才不會被算成頻帶外能量
+SPEECH_BAND_HZ = (80, 4000)
+# 能量需高於背景底噪多少 dB 才視為有聲音；再低於此絕對值一律視為靜音
+ENERGY_MARGIN_DB = 12.0
+ENERGY_MIN_DB = -50.0
+# 人聲頻帶能量占比下限
+SPEECH_BAND_RATIO = 0.4
+# 人聲的音節起伏明顯，約 1 秒內的能量標準差低於此值多半是持續的音樂或噪音；
+# 有背景音樂墊底時起伏會被壓平，門檻不能設太高
+MODULATION_WINDOW_SECONDS = 1.0
+MODULATION_MIN_DB = 2.0
+# 人聲區段前後保留的餘量、區段內最少的人聲音框總長，以及只跳過長於此秒數的非人聲區段
+PAD_SECONDS = 0.3
+MIN_SPEECH_SECONDS = 0.6
+MIN_SKIP_SECONDS = 3.0
+
+
+def vad_enabled() -> bool:
+    """VAD 是啟發式判斷，誤判時會漏掉人聲，因此預設關閉，需設定 VIDEO2SUM_VAD=1 啟用"""
+    return os.getenv("VIDEO2SUM_VAD", "").strip().lower() in ("1", "true", "yes", "y")
+
+
+def frame_features(audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每個音框的能量（dB）與人聲頻帶能量占比；分批計算，memmap 也不會一次讀進記憶體"""
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    n_frames = len(audio) // frame
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    band_ratio = np.empty(n_frames, dtype=np.float32)
+    freqs = np.fft.rfftfreq(frame, 1 / SAMPLE_RATE)
+    band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    window = np.hanning(frame).astype(np.float32)
+    block = 2000  # 每批 2000 個音框（約 1 分鐘）
+    for i in range(0, n_frames, block):
+        j = min(i + block, n_frames)
+        frames = np.asarray(audio[i * frame:j * frame], dtype=np.float32).reshape(j - i, frame)
+        energy_db[i:j] = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        spectrum = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        band_ratio[i:j] = spectrum[:, band].sum(axis=1) / (spectrum.sum(axis=1) + 1e-10)
+    return energy_db, band_ratio
+
+
+def _rolling_std(values: np.ndarray, width: int) -> np.ndarray:
+    """以累積和計算置中的滑動標準差"""
+    if len(values) == 0:
+        return values
+    pad = width // 2
+    padded = np.pad(values.astype(np.float64), (pad, width - pad - 1), mode='edge')
+    c1 = np.concatenate(([0.0], np.cumsum(padded)))
+    c2 = np.concatenate(([0.0], np.cumsum(padded ** 2)))
+    mean = (c1[width:] - c1[:-width]) / width
+    var = (c2[width:] - c2[:-width]) / width - mean ** 2
+    return np.sqrt(np.maximum(var, 0))
+
+
+def _mask_regions(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """布林陣列中連續為 True 的 [start, end) 區間"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_speech(audio: np.ndarray) -> List[Tuple[float, float]]:
+    """回傳人聲區段 [(start, end), ...]（秒）
+
+    以能量、人聲頻帶占比與能量起伏判斷，偏向保守：只有長於 MIN_SKIP_SECONDS 的
+    靜音、音樂段落會被排除，句間停頓一律保留讓 Whisper 有完整上下文。
+    """
+    duration = len(audio) / SAMPLE_RATE
+    energy_db, band_ratio = frame_features(audio)
+    if len(energy_db) == 0:
+        return []
+    threshold = max(float(np.percentile(energy_db, 10)) + ENERGY_MARGIN_DB, ENERGY_MIN_DB)
+    modulation = _rolling_std(energy_db, max(1, int(MODULATION_WINDOW_SECONDS / FRAME_SECONDS)))
+    mask = (energy_db > threshold) & (band_ratio >= SPEECH_BAND_RATIO) & (modulation >= MODULATION_MIN_DB)
+
+    regions: List[Tuple[float, float]] = []
+    voiced: List[float] = []
+    for start, end in _mask_regions(mask):
+        seconds = float(end - start) * FRAME_SECONDS
+        start = max(0.0, float(start) * FRAME_SECONDS - PAD_SECONDS)
+        end = min(duration, float(end) * FRAME_SECONDS + PAD_SECONDS)
+        if regions and start - regions[-1][1] < MIN_SKIP_SECONDS:
+            regions[-1] = (regions[-1][0], end)
+            voiced[-1] += seconds
+        else:
+            regions.append((start, end))
+            voiced.append(seconds)
+    # 合併後仍只有零星幾個音框的區段視為雜音（咳嗽、點擊聲）
+    regions = [r for r, v in zip(regions, voiced) if v >= MIN_SPEECH_SECONDS]
+    # 開頭與結尾太短的非人聲也不值得跳過
+    if regions and regions[0][0] < MIN_SKIP_SECONDS:
+        regions[0] = (0.0, regions[0][1])
+    if regions and duration - regions[-1][1] < MIN_SKIP_SECONDS:
+        regions[-1] = (regions[-1][0], duration)
+    return regions
+
+
+class SpeechMap:
+    """人聲區段與壓縮後時間軸的對照，用來把 Whisper 的時間碼換回原始時間軸"""
+
+    def __init__(self, regions: List[Tuple[float, float]], duration: float):
+        self.duration = duration
+        # 以取樣點為單位，避免壓縮與還原時累積誤差
+        self.regions = [(int(round(s * SAMPLE_RATE)), int(round(e * SAMPLE_RATE))) for s, e in regions]
+        lengths = [e - s for s, e in self.regions]
+        self.compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64) \
+            if lengths else np.zeros(0, dtype=np.int64)
+        self.speech_samples = int(sum(lengths))
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.speech_samples / SAMPLE_RATE
+
+    @property
+    def skipped_seconds(self) -> float:
+        return max(0.0, self.duration - self.speech_seconds)
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        """只取出人聲區段並接成一段；來源為 memmap 時結果也寫在同一目錄的 memmap"""
+        filename = getattr(audio, 'filename', None)
+        if filename:
+            out = np.memmap(Path(filename).with_name("speech.pcm"), dtype=np.float32,
+                            mode='w+', shape=(max(1, self.speech_samples),))
+        else:
+            out = np.empty(self.speech_samples, dtype=np.float32)
+        for (start, end), offset in zip(self.regions, self.compact_starts):
+            out[offset:offset + end - start] = audio[start:end]
+        if filename:
+            out.flush()
+        return out[:self.speech_samples]
+
+    def to_original(self, t: float, is_end: bool = False) -> float:
+        """壓縮時間軸上的秒數 → 原始時間軸；剛好落在接點的結束時間歸到前一段"""
+        if not self.regions:
+            return t
+        sample = t * SAMPLE_RATE
+        side = 'left' if is_end else 'right'
+        idx = max(0, int(np.searchsorted(self.compact_starts, sample, side=side)) - 1)
+        start, end = self.regions[idx]
+        return float(min(start + (sample - self.compact_starts[idx]), end)) / SAMPLE_RATE
+
+    def remap_segments(self, segments: List[Dict]) -> List[Dict]:
+        remapped = []
+        for seg in segments:
+            seg = dict(seg)
+            seg['start'] = self.to_original(seg['start'])
+            seg['end'] = max(seg['start'], self.to_original(seg['end'], is_end=True))
+            remapped.append(seg)
+        return remapped
+
+    def report(self) -> str:
+        percent = self.skipped_seconds / self.duration * 100 if self.duration else 0.0
+        return (f"VAD: {len(self.regions)} speech regions, {self.speech_seconds:.1f}s speech, "
+                f"skipped {self.skipped_seconds:.1f}s of {self.duration:.1f}s ({percent:.1f}%)")
+
+
+def speech_map(audio: np.ndarray) -> Optional[SpeechMap]:
+    """偵測人聲並建立 SpeechMap；找不到人聲或沒有可跳過的段落時回傳 None，照原音訊轉錄"""
+    duration = len(audio) / SAMPLE_RATE
+    regions = detect_speech(audio)
+    if not regions:
+        logger.warning("VAD: no speech detected, transcribing the full audio")
+        return None
+    mapping = SpeechMap(regions, duration)
+    if mapping.skipped_seconds < MIN_SKIP_SECONDS:
+        logger.info(f"VAD: nothing to skip ({duration:.1f}s of speech)")
+        return None
+    return mapping
@@ -0,0 +1,93 @@
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import yt_dlp
+
+from paths import state_dir
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+# yt-dlp 回傳的格式網址帶有會過期的簽章，完整 info 只在這段時間內直接拿來下載
+INFO_JSON_MAX_AGE = 3600
+
+
+def _cache_base(url: str) -> Path:
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+    return state_dir("metadata") / key
+
+
+def _pick_audio_format(formats) -> Optional[Dict]:
+    """挑選位元率最高的純音訊格式（與 yt-dlp 的 bestaudio 一致）"""
+    audio = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    if not audio:
+        return None
+    best = max(audio, key=lambda f: (f.get('abr') or f.get('tbr') or 0, f.get('filesize') or 0))
+    return {k: best.get(k) for k in ('format_id', 'ext', 'acodec', 'abr', 'asr', 'filesize')}
+
+
+def _summarize(info: Dict) -> Dict:
+    """只保留後續流程需要的欄位"""
+    formats = info.get('formats') or []
+    return {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'extractor': info.get('extractor_key'),
+        'webpage_url': info.get('webpage_url'),
+        'formats': [
+            {k: f.get(k) for k in ('format_id', 'ext', 'acodec', 'vcodec', 'abr', 'tbr', 'filesize')}
+            for f in formats
+        ],
+        'audio_format': _pick_audio_format(formats),
+        'extracted_at': time.time(),
+    }
+
+
+def _extract(url: str) -> Dict:
+    """以 yt-dlp Python API 在本行程內擷取一次影片資訊"""
+    options = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'socket_timeout': 10}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+
+def load_metadata(url: str, refresh: bool = False) -> Dict:
+    """取得影片資訊（標題、時長、可用格式、選定的音訊格式）
+
+    優先讀取快取；沒有快取（或 refresh=True）時才呼叫 yt-dlp，結果同時寫入摘要與完整
+    info JSON。擷取失敗回傳空 dict。
+    """
+    base = _cache_base(url)
+    summary_path = base.with_suffix('.json')
+    if not refresh and summary_path.exists():
+        try:
+            return json.loads(summary_path.read_text(encoding='utf-8'))
+        except json.JSONDecodeError:
+            pass
+    for attempt in range(MAX_RETRIES):
+        try:
+            info = _extract(url)
+            break
+        except yt_dlp.utils.DownloadError as e:
+            if attempt < MAX_RETRIES - 1:
+                logger.warning(f"Retry {attempt + 1}/{MAX_RETRIES} extracting metadata")
+                continue
+            logger.error(f"Failed to extract metadata: {e}")
+            return {}
+    summary = _summarize(info)
+    base.with_suffix('.info.json').write_text(json.dumps(info, ensure_ascii=False), encoding='utf-8')
+    summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    return summary
+
+
+def fresh_info_json(url: str) -> Optional[str]:
+    """回傳仍可直接用於下載（yt-dlp --load-info-json）的完整 info 路徑；過期時重新擷取"""
+    path = _cache_base(url).with_suffix('.info.json')
+    if not path.exists() or time.time() - path.stat().st_mtime > INFO_JSON_MAX_AGE:
+        if not load_metadata(url, refresh=True):
+            return None
+    return str(path)
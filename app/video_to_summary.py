@@ -6,7 +6,6 @@ import subprocess
 import argparse
 from pathlib import Path
 from typing import Optional, Tuple, Dict
-import whisper
 import logging
 from datetime import datetime
 import textwrap
@@ -16,8 +15,25 @@ import pathlib
 from tqdm import tqdm
 import shutil
 import time
+import threading
 import requests
 from dotenv import load_dotenv
+from bandwidth import get_governor
+from m3u8_downloader import get_downloader
+from paths import place_srt
+from video_metadata import load_metadata, fresh_info_json
+from media_probe import get_media_probe, audio_stream, ProbeError
+from audio_decode import decode_pcm, release_pcm, PCMStream, follow_file, SAMPLE_RATE, MEMMAP_THRESHOLD_SECONDS
+from model_pool import get_model_pool, parse_size
+from model_profile import choose_model, parse_duration
+from engines import get_engine
+from transcription import (transcribe_serial, transcribe_parallel, transcribe_streaming, transcribe_checkpointed,
+                           checkpoint_enabled, transcribe_workers, audio_key, TranscriptCheckpoint)
+from vad import vad_enabled, speech_map
+from transcript_cache import get_transcript_cache, hash_audio
+from source_registry import get_source_registry
+from summary_cache import get_summary_cache
+from fingerprint import dedup_enabled, compute_fingerprint, get_fingerprint_index, shift_srt, shift_notes
 
 # --- Docker/團隊部署防呆：檢查 .env 與金鑰 ---
 def check_env_and_key():
@@ -58,6 +74,10 @@ CATEGORIES = {
 
 # 從環境變數讀取模型，若無則使用預設值
 GEMINI_MODEL_NAME = os.getenv("VIDEO2SUM_GEMINI_MODEL", "gemini-2.5-pro")
+# 摘要 prompt 範本版本：修改 summarize_srt 的 prompt_template 時請遞增，舊的摘要快取才會失效
+SUMMARY_PROMPT_VERSION = 1
+# 轉錄引擎：whisper（openai-whisper，預設）或 faster-whisper（CTranslate2 int8，CPU 較快）
+WHISPER_ENGINE = os.getenv("VIDEO2SUM_WHISPER_ENGINE", "whisper")
 
 class VideoProcessor:
     def __init__(self, url, base_dir=None, category:str|None=None, subcategory:str|None=None):
@@ -232,26 +252,67 @@ class VideoProcessor:
         print("- 快速測試：選擇 1 (tiny)")
         print("- 高品質需求：選擇 4 或 5 (medium/large)")
         print("- 記憶體有限：選擇 1 或 2 (tiny/base)")
+        print("  [A] │auto    │依期限與記憶體上限，從本機校正結果自動挑選（見 model_profile.py）")
         model_map = {code: name for code, name, *_ in whisper_models}
-        while True:
-            model_choice = input("請選擇 Whisper 模型代號 (1-5，預設 3)：").strip()
-            if not model_choice:
-                self.whisper_model = "small"
-                break
-            elif model_choice in model_map:
-                self.whisper_model = model_map[model_choice]
-                break
-            else:
-                print("請只輸入 1~5 的代號，不要輸入說明文字！\n")
+        model_map['A'] = "auto"
+        preset = os.getenv("VIDEO2SUM_WHISPER_MODEL", "").strip().lower()
+        if preset in model_map.values():
+            self.whisper_model = preset
+        else:
+            while True:
+                model_choice = input("請選擇 Whisper 模型代號 (1-5 或 A，預設 3)：").strip().upper()
+                if not model_choice:
+                    self.whisper_model = "small"
+                    break
+                elif model_choice in model_map:
+                    self.whisper_model = model_map[model_choice]
+                    break
+                else:
+                    print("請只輸入 1~5 或 A 的代號，不要輸入說明文字！\n")
         print(f"Whisper 模型 [{self.whisper_model}] 已選擇，繼續下個階段...\n", flush=True)
+        # 自動選擇時的預估轉錄秒數，轉錄後與實際耗時比對
+        self.predicted_seconds: Optional[float] = None
         
         self.is_m3u8 = 'gdcvault.com' in url
+        # m3u8 串流網址：在本行程內探索一次，影片與音訊下載共用
+        self._stream_url: Optional[str] = None
+        # --refresh / VIDEO2SUM_REFRESH：不沿用摘要快取與其他來源的筆記，重新整理並覆寫快取（逐字稿快取照常使用），影片資訊也重新擷取
+        self.refresh = refresh_requested()
+        # --retranscribe / VIDEO2SUM_RETRANSCRIBE：連逐字稿快取也不讀，重新轉錄並覆寫
+        self.retranscribe = retranscribe_requested()
+        self._metadata = None
         self.video_title = self._get_video_title()
         self.output_dir = self.base_dir / self.category / self.subcategory / f"{self.video_title}"
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.audio_path = self.output_dir / f"{self.video_title}.mp3"
+        # 只有要求保留音訊檔時才轉成 MP3；否則轉錄直接從來源（或原生格式的下載檔）解碼
+        self.keep_audio = os.getenv("VIDEO2SUM_KEEP_AUDIO", "").strip().lower() in ("1", "true", "yes", "y")
+        self.audio_source: Optional[Path] = None
+        # 音訊是否由一般流程的 download_audio 下載：只有此時解碼出的雜湊才與重跑時一致，
+        # 可登記為此來源的逐字稿（邊下載邊轉錄的 ADTS 與一般流程的 m4a 解碼結果不同）
+        self._audio_downloaded = False
+        # 邊下載邊轉錄：音訊一邊下載一邊解碼、逐窗轉錄並追加 SRT
+        self.streaming = os.getenv("VIDEO2SUM_STREAMING", "").strip().lower() in ("1", "true", "yes", "y")
+        # 平行轉錄的子行程數：在開始下載前檢查，設定錯誤時退回單一行程並提示
+        self.transcribe_workers = transcribe_workers()
         self.srt_path = self.output_dir / f"{self.video_title}.srt"
+        # 查詢逐字稿快取時解碼的音訊與快取鍵，未命中時交給 transcribe_audio 沿用
+        self._pcm = None
+        self._transcript_key: Optional[str] = None
+        # 聲學指紋（解碼時計算），處理完成後登記到指紋索引；與其他來源重複時沿用其筆記
+        self._fingerprint = None
+        self._audio_seconds = 0.0
+        self._notes_reused = False
+        # 沿用的其他來源與比對結果，登記在已處理來源登記表，誤判時可以找出並以 --refresh 重做
+        self._duplicate_of: Optional[Dict] = None
         
+    @property
+    def metadata(self) -> Dict:
+        """yt-dlp 影片資訊：每個工作只擷取一次，並持久化供後續階段與重跑使用"""
+        if self._metadata is None:
+            self._metadata = load_metadata(self.url, refresh=self.refresh)
+        return self._metadata
+
     def _get_video_title(self) -> str:
         """獲取影片標題並格式化"""
         # 若是本地檔案或 SRT，直接用檔名
@@ -275,14 +336,11 @@ class VideoProcessor:
                 logger.error(f"從 M3U8 URL 提取標題時發生錯誤: {e}")
                 raw_title = "m3u8_stream"
         else:
-            # 對於 YouTube 和其他影片，使用 yt-dlp
-            try:
-                cmd = ['yt-dlp', '--socket-timeout', '10', '--print', '%(title)s', self.url]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                raw_title = result.stdout.strip()
-            except subprocess.CalledProcessError as e:
-                logger.error(f"使用 yt-dlp 獲取影片標題時發生錯誤: {e}")
-                raise
+            # 對於 YouTube 和其他影片，使用 yt-dlp 擷取的影片資訊
+            raw_title = self.metadata.get('title')
+            if not raw_title:
+                logger.error("使用 yt-dlp 獲取影片標題時發生錯誤")
+                raise RuntimeError(f"無法取得影片標題: {self.url}")
 
         # 統一格式化所有來源的標題
         # 1. 移除特殊字符
@@ -301,45 +359,133 @@ class VideoProcessor:
             
     def get_video_duration(self) -> int:
         """獲取影片時長（秒）"""
-        # 如果是本地檔案，使用 ffprobe 獲取時長
+        # 如果是本地檔案，使用媒體資訊快取獲取時長
         if not is_url(self.url):
             try:
-                cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                      '-show_format', self.url]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                data = json.loads(result.stdout)
-                duration = int(float(data['format']['duration']))
+                duration = int(get_media_probe().duration(self.url) or 0)
                 logger.info(f"Local video duration: {duration} seconds")
                 return duration
-            except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError) as e:
+            except ProbeError as e:
                 logger.error(f"Failed to get local video duration: {e}")
                 return 0
         
-        # 如果是網路影片，使用 yt-dlp
-        MAX_RETRIES = 3
-        for attempt in range(MAX_RETRIES):
-            try:
-                cmd = ['yt-dlp', '--socket-timeout', '10', '--print', '%(duration)s', self.url]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                duration = int(result.stdout.strip())
-                logger.info(f"Video duration: {duration} seconds")
-                return duration
-            except subprocess.CalledProcessError as e:
-                if attempt < MAX_RETRIES - 1:
-                    logger.warning(f"Retry {attempt + 1}/{MAX_RETRIES} getting duration")
-                    continue
-                logger.error(f"Failed to get video duration: {e}")
-                return 0
-        return 0
+        # 如果是網路影片，使用 yt-dlp 擷取的影片資訊（與標題共用同一次擷取）
+        duration = self.metadata.get('duration')
+        if not duration:
+            logger.error("Failed to get video duration")
+            return 0
+        duration = int(duration)
+        logger.info(f"Video duration: {duration} seconds")
+        return duration
+
+    @property
+    def md_path(self) -> Path:
+        return self.output_dir / f"{self.video_title}.md"
+
+    @property
+    def video_path(self) -> Path:
+        return self.output_dir / f"{self.video_title}.mp4"
+
+    def _local_video(self) -> Optional[Path]:
+        """已下載且可讀取的影片檔（含音軌）；沒有則回傳 None"""
+        if not self.video_path.exists():
+            return None
+        try:
+            if audio_stream(get_media_probe().probe(self.video_path)):
+                return self.video_path
+        except ProbeError as e:
+            logger.warning(f"既有影片檔無法讀取，改為重新下載音訊: {e}")
+        return None
+
+    def _m3u8_stream_url(self) -> Optional[str]:
+        """在本行程內探索 m3u8 串流網址；批次處理時瀏覽器池與串流網址快取跨工作沿用"""
+        if self._stream_url is None:
+            print(f"正在獲取串流網址: {self.url}")
+            urls = get_downloader().get_stream_urls(self.url, method='both')
+            # 使用最後一個 URL（通常是最高品質）
+            self._stream_url = urls[-1] if urls else None
+        return self._stream_url
+
+    def _m3u8_downloader_cmd(self) -> list:
+        """執行 m3u8_downloader.py 的指令前綴"""
+        m3u8_downloader = str(Path(__file__).parent / "m3u8_downloader.py")
+        # 啟用虛擬環境中的 Python
+        venv_python = str(Path(self.base_dir) / ".venv" / "Scripts" / "python.exe")
+        if Path(venv_python).exists():
+            python_exe = venv_python
+        else:
+            python_exe = sys.executable
+        return [python_exe, m3u8_downloader]
+
+    def _m3u8_audio_target(self) -> Path:
+        """m3u8 音訊輸出路徑：保留音訊時為 MP3，否則為不重新編碼的 m4a"""
+        return self.audio_path if self.keep_audio else self.output_dir / f"{self.video_title}.m4a"
+
+    def download_video(self) -> bool:
+        """下載影片檔；m3u8 串流以同一次分段下載同時產生 MP4 與轉錄用音訊"""
+        try:
+            if self.is_m3u8:
+                stream_url = self._m3u8_stream_url()
+                if not stream_url:
+                    logger.error("未找到任何串流網址")
+                    return False
+                audio_target = self._m3u8_audio_target()
+                print(f"▶️  下載 GDC/m3u8 影片到 {self.video_path} ...")
+                if not get_downloader().download_video(stream_url, str(self.video_path),
+                                                       audio_output=str(audio_target),
+                                                       format='mp3' if self.keep_audio else 'copy'):
+                    logger.error("下載 m3u8 影片失敗")
+                    return False
+                self.audio_source = audio_target
+            else:
+                # 其他來源預設用 yt-dlp；之後的音訊直接從這個影片檔提取
+                info_json = fresh_info_json(self.url)
+                cmd = [
+                    'yt-dlp',
+                    '-f', 'bestvideo+bestaudio/best',
+                    '--merge-output-format', 'mp4',
+                    '-o', str(self.video_path),
+                ]
+                cmd.extend(['--load-info-json', info_json] if info_json else [self.url])
+                print(f"▶️  下載影片到 {self.video_path} ...")
+                run_ytdlp(cmd)
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(f"下載影片時發生錯誤: {e}")
+            return False
 
     def download_audio(self) -> bool:
         """下載音訊"""
         try:
-            # 如果是本地檔案，直接提取音訊
-            if not is_url(self.url):
+            # 下載影片時已一併產生音訊，不必再下載一次
+            if self.audio_source and self.audio_source.exists():
+                logger.info(f"音訊已隨影片下載產生：{self.audio_source}")
+                return True
+            # 如果是本地檔案（或網路影片已下載過影片檔），直接從本地提取音訊
+            source = self.url if not is_url(self.url) else self._local_video()
+            if source:
+                try:
+                    info = get_media_probe().probe(source)
+                except ProbeError as e:
+                    logger.error(f"無法讀取本地檔案資訊: {e}")
+                    return False
+                stream = audio_stream(info)
+                if not stream:
+                    logger.error(f"本地檔案沒有音訊軌: {source}")
+                    return False
+                if not self.keep_audio:
+                    self.audio_source = Path(source)
+                    logger.info("轉錄時直接從來源檔解碼，不產生 MP3")
+                    return True
+                self.audio_source = self.audio_path
+                if stream.get('codec') == 'mp3' and 'mp3' in (info.get('format') or ''):
+                    # 來源本身就是 MP3，直接複製，不重新編碼
+                    shutil.copyfile(source, self.audio_path)
+                    logger.info(f"來源已是 MP3，直接複製至 {self.audio_path}")
+                    return True
                 cmd = [
                     'ffmpeg',
-                    '-i', self.url,
+                    '-i', str(source),
                     '-vn',  # 不包含視訊
                     '-acodec', 'mp3',
                     '-ab', '192k',  # 音訊位元率
@@ -353,37 +499,48 @@ class VideoProcessor:
             
             # 如果是網路影片
             if self.is_m3u8:
-                # 使用 M3U8 下載工具
-                m3u8_downloader = str(Path(__file__).parent / "m3u8_downloader.py")
-                
-                # 啟用虛擬環境中的 Python
-                venv_python = str(Path(self.base_dir) / ".venv" / "Scripts" / "python.exe")
-                if Path(venv_python).exists():
-                    python_exe = venv_python
-                else:
-                    python_exe = sys.executable
-                
-                cmd = [
-                    python_exe,
-                    m3u8_downloader,
-                    self.url,
-                    '-o', str(self.audio_path),
-                    '--type', 'audio'
-                ]
+                # 在本行程內使用 M3U8 下載工具
+                stream_url = self._m3u8_stream_url()
+                if not stream_url:
+                    logger.error("未找到任何串流網址")
+                    return False
+                self.audio_source = self._m3u8_audio_target()
+                # 未保留音訊時直接封裝原始 AAC 音軌，不重新編碼
+                if not get_downloader().download_audio(stream_url, str(self.audio_source),
+                                                       format='mp3' if self.keep_audio else 'copy'):
+                    logger.error("下載 m3u8 音訊失敗")
+                    return False
+                self._audio_downloaded = True
+                logger.info(f"音訊成功下載至 {self.audio_source}")
+                return True
+
+            # 使用 yt-dlp 下載：沿用已擷取的 info 與選定的音訊格式，不再重新解析
+            audio_format = self.metadata.get('audio_format') or {}
+            info_json = fresh_info_json(self.url)
+            cmd = [
+                'yt-dlp',
+                '-f', audio_format.get('format_id') or 'bestaudio/best',
+                '--continue',
+                '--no-part',
+            ]
+            if self.keep_audio:
+                cmd.extend(['-x', '--audio-format', 'mp3', '-o', str(self.audio_path)])
             else:
-                # 使用 yt-dlp 下載
-                cmd = [
-                    'yt-dlp',
-                    '-x',
-                    '--audio-format', 'mp3',
-                    '--continue',
-                    '--no-part',
-                    '-o', str(self.audio_path),
-                    self.url
-                ]
-            
-            subprocess.run(cmd, check=True)
-            logger.info(f"音訊成功下載至 {self.audio_path}")
+                # 保留原生音訊格式（m4a/webm），副檔名由 yt-dlp 決定
+                cmd.extend(['-o', str(self.output_dir / f"{self.video_title}.audio.%(ext)s")])
+            cmd.extend(['--load-info-json', info_json] if info_json else [self.url])
+            run_ytdlp(cmd)
+            if self.audio_source is None:
+                if self.keep_audio:
+                    self.audio_source = self.audio_path
+                else:
+                    downloaded = sorted(self.output_dir.glob(f"{self.video_title}.audio.*"))
+                    if not downloaded:
+                        logger.error("找不到 yt-dlp 下載的音訊檔")
+                        return False
+                    self.audio_source = downloaded[0]
+            self._audio_downloaded = True
+            logger.info(f"音訊成功下載至 {self.audio_source}")
             return True
         except subprocess.CalledProcessError as e:
             logger.error(f"下載音訊時發生錯誤: {e}")
@@ -392,11 +549,10 @@ class VideoProcessor:
     def verify_audio_duration(self, original_duration: int) -> bool:
         """驗證下載的音訊時長"""
         try:
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                  '-show_format', str(self.audio_path)]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            audio_duration = float(data['format']['duration'])
+            audio_file = self.audio_source or self.audio_path
+            audio_duration = get_media_probe().duration(audio_file)
+            if audio_duration is None:
+                raise ProbeError(f"音訊檔沒有時長資訊: {audio_file}")
             
             # 允許 ±2 秒的誤差
             if abs(audio_duration - original_duration) <= 2:
@@ -405,35 +561,64 @@ class VideoProcessor:
             else:
                 logger.warning(f"Audio duration mismatch: {audio_duration} vs {original_duration}")
                 return False
-        except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError) as e:
+        except ProbeError as e:
             logger.error(f"Error verifying audio duration: {e}")
             return False
 
     def transcribe_audio(self, model_size: str = "small", language: str = "en") -> Optional[str]:
         """轉錄音訊為 SRT"""
         try:
-            logger.info(f"Loading Whisper model ({model_size})...")
-            model = whisper.load_model(model_size)
-            
-            logger.info("Starting transcription...")
-            result = model.transcribe(
-                str(self.audio_path),
-                language=language,
-                task="transcribe",
-                verbose=True
-            )
+            # 直接解碼成 16 kHz 單聲道 PCM 交給 Whisper，省去 Whisper 再呼叫一次 ffmpeg
+            if self._pcm is not None:
+                audio, self._pcm = self._pcm, None
+            else:
+                audio = decode_pcm(self.audio_source or self.audio_path, work_dir=self.output_dir)
+            workers = self.transcribe_workers
+            engine = get_engine(WHISPER_ENGINE)
+            full_audio, mapping, checkpoint = audio, None, None
+            try:
+                # 只把人聲區段送進 Whisper，長段靜音、片頭片尾音樂直接跳過
+                if vad_enabled():
+                    mapping = speech_map(audio)
+                    if mapping:
+                        logger.info(mapping.report())
+                        audio = mapping.compact(full_audio)
+                if workers > 1:
+                    # CPU 平行模式：在靜音處切段，各子行程自行載入模型
+                    logger.info(f"Starting parallel transcription ({workers} workers)...")
+                    result = transcribe_parallel(audio, model_size, language, workers, engine=engine)
+                else:
+                    # 模型常駐於本行程的模型池，批次處理時只需載入一次
+                    model_pool = get_model_pool()
+                    model = model_pool.get(model_size, engine)
+                    logger.info(f"Starting transcription ({engine.name})...")
+                    if checkpoint_enabled():
+                        # 逐視窗寫入檢查點，中斷後重跑同一個工作會從最後定稿的位置接續
+                        checkpoint = TranscriptCheckpoint(self.output_dir / ".transcript.jsonl", {
+                            'model': model_size, 'engine': engine.name, 'language': language,
+                            'audio': audio_key(audio),
+                        })
+                        result = transcribe_checkpointed(model, audio, language, checkpoint, engine=engine)
+                    else:
+                        result = transcribe_serial(model, audio, language, engine=engine)
+                    logger.info(model_pool.report())
+            finally:
+                release_pcm(audio)
+                release_pcm(full_audio)
             
             # 生成 SRT 檔案路徑
             srt_path = self.srt_path
             segments = result["segments"]
+            if mapping:
+                # 時間碼換回原始時間軸，SRT、verify_srt 與筆記中的時間連結才會對得上
+                segments = mapping.remap_segments(segments)
             with open(srt_path, 'w', encoding='utf-8') as f:
-                for i, seg in enumerate(tqdm(segments, desc="寫入 SRT", unit="段落"), 1):
-                    print(f"{i}\n"
-                          f"{self._format_timestamp(seg['start'])} --> "
-                          f"{self._format_timestamp(seg['end'])}\n"
-                          f"{seg['text'].strip()}\n",
-                          file=f)
+                self._write_cues(f, tqdm(segments, desc="寫入 SRT", unit="段落"))
             
+            if checkpoint:
+                checkpoint.cleanup()
+            if self._transcript_key:
+                self._store_transcript(self._transcript_key, segments)
             logger.info(f"Transcription saved to {srt_path}")
             return str(srt_path)
             
@@ -441,6 +626,223 @@ class VideoProcessor:
             logger.error(f"Error during transcription: {e}")
             return None
 
+    def cached_transcript(self, model_size: str = "small", language: str = "en") -> Optional[str]:
+        """以解碼後的音訊內容查詢逐字稿快取，命中時直接寫出 SRT 並回傳路徑
+
+        未命中時保留解碼結果與快取鍵，transcribe_audio 會沿用解碼結果並在完成後寫入快取。
+        """
+        cache = get_transcript_cache()
+        if not cache:
+            return None
+        try:
+            self._transcript_key = cache.make_key(hash_audio(self._decoded_audio()), model_size,
+                                                  get_engine(WHISPER_ENGINE).name, language)
+        except Exception as e:
+            logger.warning(f"無法查詢逐字稿快取: {e}")
+            return None
+        if self.retranscribe:
+            logger.info("Re-transcription requested, overwriting the cached transcript")
+            return None
+        cached = cache.get(self._transcript_key)
+        logger.info(cache.report())
+        if not cached:
+            return None
+        release_pcm(self._pcm)
+        self._pcm = None
+        self.srt_path.write_text(cached['srt'], encoding='utf-8')
+        logger.info(f"Transcript cache hit, wrote {self.srt_path} without transcribing")
+        return str(self.srt_path)
+
+    def _decoded_audio(self):
+        """本工作解碼後的 PCM，只解碼一次（transcribe_audio 會接手並釋放）；順便計算聲學指紋"""
+        if self._pcm is None:
+            self._pcm = decode_pcm(self.audio_source or self.audio_path, work_dir=self.output_dir)
+            self._remember_fingerprint(self._pcm)
+        return self._pcm
+
+    def _remember_fingerprint(self, audio) -> None:
+        if dedup_enabled():
+            self._fingerprint = compute_fingerprint(audio)
+            self._audio_seconds = len(audio) / SAMPLE_RATE
+
+    def reuse_duplicate(self) -> Optional[str]:
+        """聲學指紋比對：同一場演講已由其他來源處理過時，平移時間碼後沿用其 SRT 與重點筆記"""
+        if not dedup_enabled():
+            return None
+        try:
+            self._decoded_audio()
+        except Exception as e:
+            logger.warning(f"無法計算聲學指紋: {e}")
+            return None
+        if self.refresh:
+            # 仍計算指紋，完成後以這次的產出登記
+            return None
+        match = get_fingerprint_index().find(self._fingerprint, self._audio_seconds, self.url)
+        if not match:
+            return None
+        logger.warning(f"Acoustic fingerprint matches {match['source']} (bit error rate {match['ber']:.3f}, "
+                       f"offset {match['offset']:+.1f}s), reusing its transcript instead of transcribing; "
+                       f"rerun with --refresh if this is a different recording")
+        self._duplicate_of = {'reused_from': match['source'], 'ber': round(float(match['ber']), 4),
+                              'offset': round(float(match['offset']), 3)}
+        release_pcm(self._pcm)
+        self._pcm = None
+        srt = Path(match['srt_path']).read_text(encoding='utf-8')
+        self.srt_path.write_text(shift_srt(srt, match['offset']), encoding='utf-8')
+        if match['md_path']:
+            notes = Path(match['md_path']).read_text(encoding='utf-8')
+            old_url = match['source'] if is_url(match['source']) else ''
+            new_url = self.url if is_url(self.url) else ''
+            self.md_path.write_text(shift_notes(notes, match['offset'], old_url, new_url), encoding='utf-8')
+            self._notes_reused = True
+        print(f"✅ 與已處理的 {match['source']} 內容相同，沿用其逐字稿"
+              f"{'與重點筆記' if self._notes_reused else ''}（時間差 {match['offset']:+.1f} 秒，"
+              f"位元錯誤率 {match['ber']:.3f}）；若判斷錯誤請以 --refresh 重新處理")
+        return str(self.srt_path)
+
+    def _register_fingerprint(self) -> None:
+        """把本工作的聲學指紋與產出檔登記到索引，供之後的其他來源比對"""
+        if self._fingerprint is None or not len(self._fingerprint) or not self.srt_path.exists():
+            return
+        try:
+            get_fingerprint_index().add(self.url, self._fingerprint, self._audio_seconds, str(self.srt_path),
+                                        str(self.md_path) if self.md_path.exists() else None)
+        except Exception as e:
+            logger.warning(f"登記聲學指紋失敗: {e}")
+
+    def _store_transcript(self, key: str, segments) -> None:
+        """把完成的逐字稿（原始時間軸上的段落與 SRT）寫入快取
+
+        只有音訊由 download_audio 下載時才登記來源與雜湊的對應，has_source 判斷改走一般流程後才一定命中。
+        """
+        cache = get_transcript_cache()
+        if not cache:
+            return
+        try:
+            cache.put(key, [{'start': float(seg['start']), 'end': float(seg['end']), 'text': seg['text']}
+                            for seg in segments],
+                      self.srt_path.read_text(encoding='utf-8'),
+                      source=self._source_key() if self._audio_downloaded else None)
+        except Exception as e:
+            logger.warning(f"寫入逐字稿快取失敗: {e}")
+
+    def _write_cues(self, f, segments, start_index: int = 0) -> int:
+        """寫入 SRT 字幕段落，回傳最後一段的序號"""
+        index = start_index
+        for seg in segments:
+            index += 1
+            print(f"{index}\n"
+                  f"{self._format_timestamp(seg['start'])} --> "
+                  f"{self._format_timestamp(seg['end'])}\n"
+                  f"{seg['text'].strip()}\n",
+                  file=f)
+        return index
+
+    def _audio_ready(self) -> bool:
+        """音訊是否已可直接取得（隨影片下載產生、或已有本地影片檔），不必再下載"""
+        return bool(self.audio_source and self.audio_source.exists()) or self._local_video() is not None
+
+    def _streaming_download(self) -> Tuple[list, Path]:
+        """邊下載邊轉錄用的下載指令與輸出檔：輸出必須是可邊寫邊讀的格式
+
+        m3u8 以串流合併依序寫出 ADTS（或保留音訊時的 MP3）；其他來源由 yt-dlp 直接寫出原生音訊。
+        """
+        if self.is_m3u8:
+            target = self.audio_path if self.keep_audio else self.output_dir / f"{self.video_title}.aac"
+            # 串流網址在本行程內探索（共用瀏覽器池），下載子行程直接使用
+            cmd = self._m3u8_downloader_cmd() + [
+                self._m3u8_stream_url() or self.url,
+                '-o', str(target),
+                '--type', 'audio',
+                '--stream-merge',
+                '--format', 'mp3' if self.keep_audio else 'copy',
+            ]
+            return cmd, target
+        audio_format = self.metadata.get('audio_format') or {}
+        target = self.output_dir / f"{self.video_title}.audio.{audio_format.get('ext') or 'm4a'}"
+        info_json = fresh_info_json(self.url)
+        cmd = [
+            'yt-dlp',
+            '-f', audio_format.get('format_id') or 'bestaudio/best',
+            '--no-part',
+            '-o', str(target),
+        ]
+        cmd.extend(['--load-info-json', info_json] if info_json else [self.url])
+        return cmd, target
+
+    @staticmethod
+    def _feed_stream(target: Path, proc: subprocess.Popen, stream: PCMStream) -> None:
+        """把下載中的檔案新寫入的部分持續送進解碼器"""
+        try:
+            for data in follow_file(target, lambda: proc.poll() is None):
+                if not stream.feed(data):
+                    break
+        finally:
+            stream.close()
+
+    def download_and_transcribe(self, model_size: str = "small", language: str = "en",
+                                duration: int = 0) -> Optional[str]:
+        """邊下載邊轉錄：下載與轉錄重疊進行，總時間接近兩者較長者而非相加
+
+        每轉錄完一個視窗就把字幕追加進 SRT。此模式不做 VAD 前處理，也只使用單一行程轉錄。
+        """
+        cmd, target = self._streaming_download()
+        if target.exists():
+            # 從頭重新下載，解碼器才會從檔案開頭讀起
+            target.unlink()
+        memmap_path = self.output_dir / "audio.pcm" if duration > MEMMAP_THRESHOLD_SECONDS else None
+        stream = PCMStream(int((duration + 1) * SAMPLE_RATE), memmap_path)
+        print(f"▶️  邊下載邊轉錄到 {self.srt_path} ...")
+        governor = get_governor()
+        # m3u8 下載子行程自行向頻寬管理器登記；yt-dlp 則在下載期間以本行程的份額限速
+        proc = governor.popen_ytdlp(cmd) if governor and not self.is_m3u8 else subprocess.Popen(cmd)
+        feeder = threading.Thread(target=self._feed_stream, args=(target, proc, stream), daemon=True)
+        feeder.start()
+        try:
+            # 下載進行時載入模型
+            engine = get_engine(WHISPER_ENGINE)
+            model_pool = get_model_pool()
+            model = model_pool.get(model_size, engine)
+            logger.info(f"Starting streaming transcription ({engine.name})...")
+            with open(self.srt_path, 'w', encoding='utf-8') as f:
+                count = 0
+
+                def append(segments):
+                    nonlocal count
+                    count = self._write_cues(f, segments, count)
+                    f.flush()
+
+                result = transcribe_streaming(stream, model, language, append, engine=engine)
+            logger.info(model_pool.report())
+            if proc.wait() != 0:
+                logger.error(f"下載音訊時發生錯誤（exit {proc.returncode}），SRT 可能不完整")
+                return None
+            if stream.size == 0 or count == 0:
+                # 解碼器沒讀到任何音訊（例如 moov 在檔尾的 MP4）或沒有產生字幕，交給一般流程重新解碼
+                logger.error(f"Streaming transcription produced no {'audio' if stream.size == 0 else 'cues'}")
+                return None
+            self.audio_source = target
+            if get_transcript_cache():
+                key = get_transcript_cache().make_key(hash_audio(stream.result()), model_size, engine.name, language)
+                self._store_transcript(key, result['segments'])
+            self._remember_fingerprint(stream.result())
+            logger.info(f"Transcription saved to {self.srt_path} ({count} cues)")
+            return str(self.srt_path)
+        except Exception as e:
+            logger.error(f"Error during streaming transcription: {e}")
+            return None
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            feeder.join()
+            release_pcm(stream.result())
+            if proc.returncode == 0:
+                # 下載已完成：即使無法邊下載邊解碼（例如 moov 在檔尾的 MP4），一般流程也能直接沿用此檔
+                self.audio_source = target
+            elif target.exists():
+                target.unlink()
+
     def verify_srt(self, original_duration: int, srt_path: str) -> bool:
         """驗證 SRT 轉錄完整性"""
         try:
@@ -479,6 +881,13 @@ class VideoProcessor:
     def cleanup_temp_files(self) -> None:
         """清理暫存檔案"""
         try:
+            if self.keep_audio:
+                return
+            # 本地來源檔與下載的影片檔不能刪，只清理下載下來的音訊
+            if (self.audio_source and is_url(self.url) and self.audio_source != self.video_path
+                    and self.audio_source.exists()):
+                self.audio_source.unlink()
+                logger.info(f"Cleaned up temporary audio file: {self.audio_source}")
             if self.audio_path.exists():
                 self.audio_path.unlink()
                 logger.info(f"Cleaned up temporary audio file: {self.audio_path}")
@@ -494,15 +903,15 @@ class VideoProcessor:
         milliseconds = int((seconds - int(seconds)) * 1000)
         return f"{hours:02d}:{minutes:02d}:{int(seconds):02d},{milliseconds:03d}"
 
-    def summarize_srt(self, srt_path):
-        """讀取 SRT 檔案，使用 Gemini API 進行摘要"""
+    def summarize_srt(self, srt_path) -> bool:
+        """讀取 SRT 檔案，使用 Gemini API 進行摘要；成功產生筆記時回傳 True"""
         logger.info("開始生成摘要...")
         try:
             with open(srt_path, 'r', encoding='utf-8') as f:
                 srt_content = f.read()
         except FileNotFoundError:
             logger.error(f"SRT 檔案未找到: {srt_path}")
-            return
+            return False
 
         # 移除時間戳和序列號
         text_content = re.sub(r'\d+\n\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}\n', '', srt_content)
@@ -575,65 +984,143 @@ class VideoProcessor:
             # logger.info(f"使用的模型: {GEMINI_MODEL}")
             logger.info(f"使用的模型: {GEMINI_MODEL_NAME}")
             
-            # 使用 VIDEO2SUM_GEMINI_API_KEY 環境變數
-            api_key = os.getenv("VIDEO2SUM_GEMINI_API_KEY")
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-            response = model.generate_content(
-                prompt,
-                generation_config={"temperature":0.3}
-            )
-            md_text = response.text.strip()
+            generation_config = {"temperature": 0.3}
+
+            def generate() -> str:
+                # 使用 VIDEO2SUM_GEMINI_API_KEY 環境變數
+                api_key = os.getenv("VIDEO2SUM_GEMINI_API_KEY")
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                response = model.generate_content(
+                    prompt,
+                    generation_config=generation_config
+                )
+                return response.text
+
+            # 逐字稿、模型、生成參數與 prompt 範本都沒變時沿用快取；同時送出的相同請求只呼叫一次 API
+            summary_cache = get_summary_cache()
+            if summary_cache:
+                key = summary_cache.make_key(text_content, GEMINI_MODEL_NAME, generation_config,
+                                             SUMMARY_PROMPT_VERSION, video_url)
+                md_text = summary_cache.get_or_generate(key, GEMINI_MODEL_NAME, generate,
+                                                        refresh=self.refresh).strip()
+            else:
+                md_text = generate().strip()
             
             # 自動移除開頭/結尾的 code block 標記
             md_text = re.sub(r'^(\s*```markdown\s*|\s*```\s*)', '', md_text)
             md_text = re.sub(r'(\s*```\s*)$', '', md_text)
             
-            md_path = self.output_dir / f"{self.video_title}.md"
+            md_path = self.md_path
             md_path.write_text(md_text.strip(), encoding="utf-8")
             print(f"✅ 已產生重點筆記 → {md_path}")
             
             # 只有在處理本地檔案時才複製 SRT（URL 處理時 SRT 已在正確位置）
             if not is_url(getattr(self, 'url', '')):
-                # 分析完自動複製 SRT 檔案到分類後資料夾，若目標已存在則自動備份
-                output_srt = self.output_dir / f"{self.video_title}.srt"
-                output_srt.parent.mkdir(parents=True, exist_ok=True)
-                if output_srt.exists():
-                    backup_path = output_srt.with_suffix(f".srt.bak_{int(time.time())}")
-                    output_srt.rename(backup_path)
-                    print(f"⚠️  目標 SRT 已存在，已自動備份為 {backup_path}")
+                # 分析完自動移動 SRT 檔案到分類後資料夾，若目標已存在則自動備份
+                # （本地影片轉錄出的 SRT 本來就在目標位置，不會被備份掉）
                 try:
-                    # 使用移動，更有效率且避免重複檔案
-                    shutil.move(str(srt_path), str(output_srt))
-                    print(f"✅ 已將 {srt_path} 移動到 {output_srt}")
+                    place_srt(srt_path, self.srt_path)
                 except Exception as e:
                     print(f"⚠️  移動 SRT 檔案時發生錯誤：{e}")
                     print(f"   原始檔案仍在：{srt_path}")
             else:
                 print(f"✅ SRT 檔案已保存在 {srt_path}")
+            return True
             
         except Exception as e:
             logger.error(f"Error during summarization: {e}")
+            return False
+
+    def _source_key(self) -> Optional[str]:
+        """來源鍵：GDC ID、正規化網址或檔案雜湊"""
+        try:
+            return get_source_registry().source_key(self.url)
+        except Exception as e:
+            logger.warning(f"無法計算來源鍵: {e}")
+            return None
+
+    def _record_stage(self, stage: str, params: Optional[Dict] = None, **artifacts: Path) -> None:
+        """在已處理來源登記表記錄階段完成（以 GDC ID、正規化網址或檔案雜湊為鍵）"""
+        key = self._source_key()
+        if not key:
+            return
+        try:
+            get_source_registry().record(key, self.url, stage, self.output_dir, params=params, **artifacts)
+        except Exception as e:
+            logger.warning(f"寫入已處理來源登記表失敗: {e}")
+
+    def _transcript_cached(self) -> bool:
+        """此來源上次下載的音訊已有逐字稿快取時，改走一般流程：下載完直接命中快取，不必邊下載邊轉錄"""
+        cache = get_transcript_cache()
+        if not cache or self.retranscribe:
+            return False
+        key = self._source_key()
+        return bool(key) and cache.has_source(key, self.whisper_model, get_engine(WHISPER_ENGINE).name,
+                                              self.language)
+
+    def _resolve_auto_model(self, duration: int) -> None:
+        """自動模式：依影片時長、轉錄期限與記憶體上限挑出最準確且來得及的模型"""
+        deadline = os.getenv("VIDEO2SUM_TRANSCRIBE_DEADLINE", "").strip()
+        memory_cap = os.getenv("VIDEO2SUM_MODEL_MEMORY_CAP", "").strip()
+        chosen = choose_model(duration,
+                              deadline=parse_duration(deadline) if deadline else None,
+                              memory_cap=parse_size(memory_cap) if memory_cap else get_model_pool().budget,
+                              engine_name=WHISPER_ENGINE)
+        if not chosen:
+            logger.warning("No Whisper model profile on this host (run model_profile.py calibrate), using small")
+            self.whisper_model = "small"
+            return
+        self.whisper_model, self.predicted_seconds = chosen
+        logger.info(f"Auto-selected Whisper model {self.whisper_model} for {duration}s of audio "
+                    f"(deadline {deadline or 'none'}), predicted {self.predicted_seconds:.0f}s")
 
     def run(self):
         # 獲取原始影片時長用於驗證
         original_duration = self.get_video_duration()
+        if self.whisper_model == "auto":
+            self._resolve_auto_model(original_duration)
+        transcribe_start = time.time()
         
-        # 下載/提取音訊
-        if not self.download_audio():
-            print("❌ 音訊下載/提取失敗")
-            return
-            
-        # 驗證音訊時長（如果是網路影片）
-        if is_url(self.url) and original_duration > 0:
-            if not self.verify_audio_duration(original_duration):
-                print("⚠️  音訊時長驗證失敗，但繼續進行轉錄")
-        
-        # 轉錄音訊
-        srt_path = self.transcribe_audio(model_size=self.whisper_model, language=self.language)
+        srt_path = None
+        if self.streaming and is_url(self.url) and not self._audio_ready() and not self._transcript_cached():
+            # 邊下載邊轉錄
+            srt_path = self.download_and_transcribe(model_size=self.whisper_model, language=self.language,
+                                                    duration=original_duration)
+            if srt_path:
+                self._record_stage("download")
+                if original_duration > 0 and not self.verify_audio_duration(original_duration):
+                    print("⚠️  音訊時長驗證失敗，但繼續進行重點整理")
+            else:
+                print("⚠️  邊下載邊轉錄失敗，改為下載完整音訊後再轉錄")
         if not srt_path:
-            print("❌ 音訊轉錄失敗")
-            return
+            # 下載/提取音訊
+            if not self.download_audio():
+                print("❌ 音訊下載/提取失敗")
+                return
+            self._record_stage("download")
+
+            # 驗證音訊時長（如果是網路影片）
+            if is_url(self.url) and original_duration > 0:
+                if not self.verify_audio_duration(original_duration):
+                    print("⚠️  音訊時長驗證失敗，但繼續進行轉錄")
+
+            # 轉錄音訊
+            transcribe_start = time.time()
+            # 相同音訊內容以相同模型、引擎與語言轉錄過時，直接沿用快取的逐字稿
+            # 其他來源（鏡像、重新上傳）已處理過同一內容時，沿用其逐字稿與筆記
+            srt_path = (self.cached_transcript(model_size=self.whisper_model, language=self.language)
+                        or self.reuse_duplicate()
+                        or self.transcribe_audio(model_size=self.whisper_model, language=self.language))
+            if not srt_path:
+                print("❌ 音訊轉錄失敗")
+                return
+        # 沒有沿用其他來源時以空設定覆寫，避免重做後仍留著先前的比對結果
+        self._record_stage("transcribe", params=self._duplicate_of or {}, srt=self.srt_path)
+        if self.predicted_seconds:
+            actual = time.time() - transcribe_start
+            logger.info(f"Whisper model {self.whisper_model}: predicted {self.predicted_seconds:.0f}s, "
+                        f"actual {actual:.0f}s ({actual / self.predicted_seconds:.2f}x)")
             
         # 驗證 SRT 完整性（如果是網路影片）
         if is_url(self.url) and original_duration > 0:
@@ -643,10 +1130,25 @@ class VideoProcessor:
         # 進行重點整理
         srt_file = self.srt_path
         if srt_file.exists():
-            print("🟢 SRT 已產生，開始進行重點整理（MD 產出）...")
-            self.summarize_srt(srt_file)
+            if self._notes_reused:
+                print(f"🟢 已沿用相同內容的重點筆記 → {self.md_path}")
+                summarized = True
+            else:
+                print("🟢 SRT 已產生，開始進行重點整理（MD 產出）...")
+                summarized = self.summarize_srt(srt_file)
+            if summarized:
+                self._record_stage("summarize", params=summary_params(), srt=self.srt_path, md=self.md_path)
             # 清理暫存檔案
             self.cleanup_temp_files()
+            self._register_fingerprint()
+
+def run_ytdlp(cmd: list) -> None:
+    """執行 yt-dlp；有設定頻寬上限時只在下載期間登記並套用本工作的份額"""
+    governor = get_governor()
+    if governor:
+        governor.run_ytdlp(cmd)
+    else:
+        subprocess.run(cmd, check=True)
 
 def is_url(s):
     return s.startswith('http://') or s.startswith('https://')
@@ -671,13 +1173,133 @@ def ensure_dirs():
         (base_dir / d).mkdir(parents=True, exist_ok=True)
 
 parser = argparse.ArgumentParser()
-parser.add_argument("input", help="影片網址或 input 資料夾內檔名（不含副檔名）", nargs="?")
+parser.add_argument("input", help="影片網址或 input 資料夾內檔名（不含副檔名），可一次指定多個", nargs="*")
+parser.add_argument("--batch", metavar="FILE",
+                    help="批次處理清單檔：每行一個網址或檔名（# 開頭為註解），全部在同一個行程內依序處理")
+parser.add_argument("--refresh", action="store_true",
+                    help="忽略已處理紀錄與摘要快取重新整理筆記（相同音訊的逐字稿仍沿用快取）")
+parser.add_argument("--retranscribe", action="store_true", help="同 --refresh，且不沿用逐字稿快取，重新轉錄")
 args = parser.parse_args()
 
+
+def retranscribe_requested() -> bool:
+    """--retranscribe 或 VIDEO2SUM_RETRANSCRIBE：連逐字稿快取也不沿用"""
+    return args.retranscribe or os.getenv("VIDEO2SUM_RETRANSCRIBE", "").strip().lower() in ("1", "true", "yes", "y")
+
+
+def refresh_requested() -> bool:
+    """--refresh 或 VIDEO2SUM_REFRESH（--retranscribe 亦同）：忽略已處理紀錄與摘要快取，重新整理"""
+    return (args.refresh or retranscribe_requested()
+            or os.getenv("VIDEO2SUM_REFRESH", "").strip().lower() in ("1", "true", "yes", "y"))
+
+
+def summary_params() -> Dict:
+    """產生筆記的設定；與登記表中不同時重新整理（逐字稿仍由快取沿用）"""
+    return {'model': GEMINI_MODEL_NAME, 'prompt_version': SUMMARY_PROMPT_VERSION}
+
+
+def already_processed(source: str) -> bool:
+    """來源已處理過（且未要求重新處理）時列出既有產出並回傳 True"""
+    if refresh_requested():
+        return False
+    try:
+        registry = get_source_registry()
+        entry = registry.lookup(registry.source_key(source), summary_params())
+    except Exception as e:
+        logger.warning(f"無法查詢已處理來源登記表: {e}")
+        return False
+    if not entry:
+        return False
+    processed_at = datetime.fromtimestamp(entry['stages']['summarize']).strftime('%Y-%m-%d %H:%M')
+    print(f"✅ 此來源已於 {processed_at} 處理過，直接沿用既有產出（加上 --refresh 可重新處理）：")
+    for name, artifact in entry['artifacts'].items():
+        note = "（登記後已修改）" if name in entry['modified'] else ""
+        print(f"   - {artifact['path']}{note}")
+    return True
+
+def read_batch_file(path: str) -> list:
+    """讀取批次清單：每行一個來源，忽略空行與 # 註解"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+
+def process_input(source: str) -> None:
+    """處理單一來源（網址、或 input 資料夾內的影片/SRT 檔名）"""
+    if is_url(source):
+        if already_processed(source):
+            return
+        vp = VideoProcessor(source)
+        # 新增：詢問是否要一併下載影片（只允許 y/n/空白，其他重問）
+        while True:
+            ans = input("要一併下載影片檔嗎？(Y/N)：").strip().lower()
+            if ans in ('', 'y'):
+                download_video = True
+                break
+            elif ans == 'n':
+                download_video = False
+                break
+            else:
+                print("請輸入 Y 或 N")
+        if download_video:
+            if not vp.download_video():
+                print("⚠️  影片下載失敗，繼續下載音訊並轉錄")
+        vp.run()
+        return
+    # 優先檢查 Docker 環境下的 /input 目錄
+    input_dirs = [pathlib.Path("/input"), pathlib.Path("input")]
+    video_path = None
+    srt_path = None
+
+    for input_dir in input_dirs:
+        if not input_dir.exists():
+            continue
+
+        for ext in [".mp4", ".mkv", ".mov", ".avi", ".webm"]:
+            candidate = input_dir / f"{source}{ext}"
+            if candidate.exists():
+                video_path = candidate
+                break
+        srt_candidate = input_dir / f"{source}.srt"
+        if srt_candidate.exists():
+            srt_path = srt_candidate
+
+        if video_path or srt_path:
+            break
+
+    if srt_path:
+        print(f"🟢 SRT 已搜尋到，開始進行重點整理：{srt_path}")
+        # 使用完整的互動流程，與 URL 處理保持一致
+        vp = VideoProcessor(srt_path.as_posix())
+        vp.summarize_srt(srt_path)
+    elif video_path:
+        if already_processed(video_path.as_posix()):
+            return
+        print(f"▶️  找到影片檔，開始提取音訊與轉錄：{video_path}")
+        # 使用完整的互動流程，與 URL 處理保持一致
+        vp = VideoProcessor(video_path.as_posix())
+        vp.run()
+    else:
+        print(f"❌ input 資料夾找不到指定影片或 SRT：{source}")
+        # 列出可處理的檔案（媒體資訊有快取，每個檔案只需讀取一次）
+        for input_dir in input_dirs:
+            if input_dir.exists():
+                for path, info in get_media_probe().scan_directory(input_dir).items():
+                    duration = int(info.get('duration') or 0)
+                    print(f"   - {Path(path).stem}（{duration // 60} 分 {duration % 60} 秒）")
+                break
+
+
 if __name__ == "__main__":
     ensure_dirs()
+    inputs = list(args.input)
+    if args.batch:
+        try:
+            inputs.extend(read_batch_file(args.batch))
+        except OSError as e:
+            print(f"❌ 無法讀取批次清單 {args.batch}：{e}")
+            sys.exit(1)
     # 新增主選單互動，防呆處理
-    if not args.input:
+    if not inputs and not args.batch:
         while True:
             print("請選擇要處理的來源：")
             print("[1] input 資料夾內的本地影片/SRT（只需輸入檔名）")
@@ -686,96 +1308,34 @@ if __name__ == "__main__":
             user_choice = input("請輸入 1、2 或 Q：").strip().lower()
             if user_choice == '1':
                 file_name = input("請輸入 input 資料夾內的檔名（不含副檔名）：").strip()
-                args.input = file_name
+                inputs = [file_name]
                 break
             elif user_choice == '2':
                 url = input("請輸入影片連結（YouTube、m3u8）：").strip()
-                args.input = url
+                inputs = [url]
                 break
             elif user_choice == 'q':
                 print("已離開程式。")
                 sys.exit(0)
             else:
                 print("請只輸入 1、2 或 Q，不要輸入說明文字！\n")
-    if args.input:
-        if is_url(args.input):
-            vp = VideoProcessor(args.input)
-            # 新增：詢問是否要一併下載影片（只允許 y/n/空白，其他重問）
-            while True:
-                ans = input("要一併下載影片檔嗎？(Y/N)：").strip().lower()
-                if ans in ('', 'y'):
-                    download_video = True
-                    break
-                elif ans == 'n':
-                    download_video = False
-                    break
-                else:
-                    print("請輸入 Y 或 N")
-            if download_video:
-                video_path = vp.output_dir / f"{vp.video_title}.mp4"
-                if vp.is_m3u8:
-                    # 用 m3u8_downloader 下載影片
-                    m3u8_downloader = str(Path(__file__).parent / "m3u8_downloader.py")
-                    venv_python = str(Path(vp.base_dir) / ".venv" / "Scripts" / "python.exe")
-                    if Path(venv_python).exists():
-                        python_exe = venv_python
-                    else:
-                        python_exe = sys.executable
-                    cmd = [
-                        python_exe,
-                        m3u8_downloader,
-                        vp.url,
-                        '-o', str(video_path),
-                        '--type', 'video'
-                    ]
-                    print(f"▶️  下載 GDC/m3u8 影片到 {video_path} ...")
-                    subprocess.run(cmd, check=True)
-                else:
-                    # 其他來源預設用 yt-dlp
-                    cmd = [
-                        'yt-dlp',
-                        '-f', 'bestvideo+bestaudio/best',
-                        '--merge-output-format', 'mp4',
-                        '-o', str(video_path),
-                        vp.url
-                    ]
-                    print(f"▶️  下載影片到 {video_path} ...")
-                    subprocess.run(cmd, check=True)
-            vp.run()
-        else:
-            # 優先檢查 Docker 環境下的 /input 目錄
-            input_dirs = [pathlib.Path("/input"), pathlib.Path("input")]
-            video_path = None
-            srt_path = None
-            
-            for input_dir in input_dirs:
-                if not input_dir.exists():
-                    continue
-                    
-                for ext in [".mp4", ".mkv", ".mov", ".avi", ".webm"]:
-                    candidate = input_dir / f"{args.input}{ext}"
-                    if candidate.exists():
-                        video_path = candidate
-                        break
-                srt_candidate = input_dir / f"{args.input}.srt"
-                if srt_candidate.exists():
-                    srt_path = srt_candidate
-                    
-                if video_path or srt_path:
-                    break
-                    
-            if srt_path:
-                print(f"🟢 SRT 已搜尋到，開始進行重點整理：{srt_path}")
-                # 使用完整的互動流程，與 URL 處理保持一致
-                vp = VideoProcessor(srt_path.as_posix())
-                vp.summarize_srt(srt_path)
-            elif video_path:
-                print(f"▶️  找到影片檔，開始提取音訊與轉錄：{video_path}")
-                # 使用完整的互動流程，與 URL 處理保持一致
-                vp = VideoProcessor(video_path.as_posix())
-                vp.run()
-            else:
-                print(f"❌ input 資料夾找不到指定影片或 SRT：{args.input}")
-    else:
+    inputs = [i for i in inputs if i]
+    if not inputs:
         print("❌ 請提供影片網址或 input 資料夾內檔名（不含副檔名）")
-
+    elif len(inputs) == 1:
+        process_input(inputs[0])
+    else:
+        # 批次模式：同一個行程依序處理，瀏覽器池、Whisper 模型池與各種快取跨工作沿用
+        failed = []
+        for n, source in enumerate(inputs, 1):
+            print(f"\n=== 批次 {n}/{len(inputs)}：{source} ===")
+            try:
+                process_input(source)
+            except Exception as e:
+                logger.error(f"批次工作失敗（{source}）: {e}")
+                failed.append(source)
+        print(f"\n批次處理完成：{len(inputs) - len(failed)}/{len(inputs)} 個成功")
+        # 同一模型只在第一個工作載入，之後的工作應全數命中
+        logger.info(get_model_pool().report())
+        for source in failed:
+            print(f"   ❌ {source}")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 程式模組直接放在 app/ 底下，以平面匯入方式使用
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
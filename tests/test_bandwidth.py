@@ -0,0 +1,75 @@
+import json
+import logging
+
+import pytest
+
+import bandwidth
+from bandwidth import BandwidthGovernor, parse_rate
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1048576", 1048576),
+    ("500K", 500 * 1024),
+    ("8M", 8 * 1024 ** 2),
+    ("8m", 8 * 1024 ** 2),
+    ("1.5M", 1.5 * 1024 ** 2),
+    ("2MB/s", 2 * 1024 ** 2),
+    ("1G", 1024 ** 3),
+    (" 100k ", 100 * 1024),
+])
+def test_parse_rate(text, expected):
+    assert parse_rate(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "abc", "0", "-5M", "M"])
+def test_parse_rate_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_invalid_env_runs_unthrottled(monkeypatch, caplog):
+    monkeypatch.setenv("VIDEO2SUM_BANDWIDTH_LIMIT", "fast")
+    with caplog.at_level(logging.WARNING, logger="bandwidth"):
+        assert BandwidthGovernor.from_env() is None
+    assert "VIDEO2SUM_BANDWIDTH_LIMIT" in caplog.text
+
+
+@pytest.fixture
+def governor(tmp_path):
+    g = BandwidthGovernor(1024 * 1024, state_path=str(tmp_path / "bandwidth.json"))
+    yield g
+    g._shutdown()
+
+
+def _jobs(g):
+    with open(g.state_path, encoding='utf-8') as f:
+        return json.load(f)['jobs']
+
+
+def test_stop_unregisters_after_last_download(governor):
+    governor.start()
+    governor.start()
+    governor.stop()
+    assert governor.job_id in _jobs(governor)
+    governor.stop()
+    assert governor._thread is None
+    assert governor.job_id not in _jobs(governor)
+
+
+def test_start_during_stop_keeps_new_heartbeat(governor, monkeypatch):
+    leave = governor._leave
+
+    def restart_then_leave(thread):
+        # 前一次 stop 還在等舊執行緒結束時，另一個下載已經開始
+        governor.start()
+        leave(thread)
+
+    monkeypatch.setattr(governor, "_leave", restart_then_leave)
+    governor.start()
+    governor.stop()
+    monkeypatch.setattr(governor, "_leave", leave)
+
+    assert governor._active == 1
+    assert governor._thread is not None and governor._thread.is_alive()
+    assert not governor._stop.is_set()
+    assert governor.job_id in _jobs(governor)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import fingerprint
+from audio_decode import SAMPLE_RATE
+from fingerprint import FingerprintIndex, best_offset, compute_fingerprint
+
+
+def _speech_like(seed, seconds=120):
+    """每 150 ms 換一個基頻與音量的諧波音節，加上少量噪音"""
+    rng = np.random.default_rng(seed)
+    n = seconds * SAMPLE_RATE
+    out = np.zeros(n, dtype=np.float32)
+    seg = int(0.15 * SAMPLE_RATE)
+    t = np.arange(seg) / SAMPLE_RATE
+    for i in range(0, n - seg, seg):
+        f0 = rng.uniform(100, 250)
+        amp = rng.uniform(0, 1) * (rng.random() > 0.2)
+        harmonics = sum(rng.uniform(0, 1) / k * np.sin(2 * np.pi * f0 * k * t + rng.uniform(0, 6))
+                        for k in range(1, 20))
+        out[i:i + seg] = amp * harmonics * np.hanning(seg)
+    return out + 0.01 * rng.standard_normal(n).astype(np.float32)
+
+
+def _copy(audio, trim):
+    """模擬另一份複本：剪掉開頭 trim 秒、音量較小、略經低通並帶有不同的噪音"""
+    copy = audio[int(round(trim * SAMPLE_RATE)):] * 0.6
+    copy = np.convolve(copy, np.ones(3) / 3, mode='same')
+    return (copy + 0.02 * np.random.default_rng(5).standard_normal(len(copy))).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def original():
+    return _speech_like(1)
+
+
+@pytest.fixture(scope="module")
+def known(original):
+    return compute_fingerprint(original)
+
+
+def test_dedup_is_opt_in(monkeypatch):
+    monkeypatch.delenv("VIDEO2SUM_DEDUP", raising=False)
+    assert not fingerprint.dedup_enabled()
+    monkeypatch.setenv("VIDEO2SUM_DEDUP", "1")
+    assert fingerprint.dedup_enabled()
+
+
+@pytest.mark.parametrize("trim", [0.0, 3.333, 10.05])
+def test_best_offset_finds_trimmed_copy(original, known, trim):
+    ber, offset = best_offset(compute_fingerprint(_copy(original, trim)), known)
+    assert ber <= fingerprint.MATCH_BIT_ERROR_RATE
+    # 複本剪掉開頭，內容出現得比較早，位移為負；誤差在半個音框以內
+    assert offset == pytest.approx(-trim, abs=fingerprint.FRAME_SECONDS / 2 + 1e-9)
+
+
+def test_best_offset_rejects_unrelated_audio(known):
+    ber, _ = best_offset(compute_fingerprint(_speech_like(2)), known)
+    assert ber > fingerprint.MATCH_BIT_ERROR_RATE
+
+
+def test_index_finds_other_source_with_offset(tmp_path, original, known):
+    srt = tmp_path / "talk.srt"
+    srt.write_text("1\n00:00:10,000 --> 00:00:12,000\nhello\n", encoding='utf-8')
+    index = FingerprintIndex(str(tmp_path / "fingerprints.sqlite3"))
+    index.add("https://example.com/a", known, 120.0, str(srt), None)
+
+    new = compute_fingerprint(_copy(original, 10.05))
+    match = index.find(new, 110.0, "https://example.com/b")
+    assert match['source'] == "https://example.com/a"
+    assert match['offset'] == pytest.approx(-10.05, abs=0.01)
+    assert match['ber'] <= fingerprint.MATCH_BIT_ERROR_RATE
+    # 不與自己比對
+    assert index.find(known, 120.0, "https://example.com/a") is None
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import m3u8_downloader
+from m3u8_downloader import M3U8Downloader, SegmentJournal
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO2SUM_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.delenv("VIDEO2SUM_BANDWIDTH_LIMIT", raising=False)
+    return M3U8Downloader(max_workers=2, use_cache=False)
+
+
+def _segments(n):
+    return [SimpleNamespace(uri=f"seg{i}.ts", absolute_uri=f"https://example.com/seg{i}.ts") for i in range(n)]
+
+
+def test_failed_segment_cancels_the_rest(downloader, tmp_path):
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(uri, path):
+        with lock:
+            calls.append(uri)
+        if uri.endswith("seg0.ts"):
+            raise OSError("connection reset")
+        return 1, "0" * 64
+
+    downloader._fetch_segment = fetch
+    with pytest.raises(OSError):
+        downloader._download_segments(_segments(200), SegmentJournal(str(tmp_path / "work")))
+    assert len(calls) < 20
+
+
+def test_journal_reloads_completed_segments_and_skips_torn_line(tmp_path):
+    work = tmp_path / "work"
+    seg = work / "seg_0.ts"
+    journal = SegmentJournal(str(work))
+    seg.write_bytes(b"abc")
+    journal.record(0, 3, hashlib.sha256(b"abc").hexdigest())
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"index": 1, "si')
+
+    reloaded = SegmentJournal(str(work))
+    assert set(reloaded.entries) == {0}
+    assert reloaded.is_complete(0, str(seg))
+    seg.write_bytes(b"abd")
+    assert not reloaded.is_complete(0, str(seg))
+    assert not reloaded.is_complete(1, str(work / "seg_1.ts"))
+
+
+class _FakeResponse:
+    def __init__(self, status_code, chunks, fail_after=None):
+        self.status_code = status_code
+        self._chunks = chunks
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+    def iter_content(self, chunk_size=1):
+        for i, chunk in enumerate(self._chunks):
+            if i == self._fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection dropped")
+            yield chunk
+
+
+def test_interrupted_segment_resumes_with_range(downloader, tmp_path, monkeypatch):
+    monkeypatch.setattr(m3u8_downloader, "RETRY_BACKOFF", 0)
+    body = b"0123456789"
+    requested = []
+
+    def get(uri, headers=None, timeout=None, stream=False):
+        requested.append((headers or {}).get('Range'))
+        if len(requested) == 1:
+            # 送出前 4 個位元組後連線中斷
+            return _FakeResponse(200, [body[:4], body[4:]], fail_after=1)
+        start = int(headers['Range'].split('=')[1].rstrip('-'))
+        return _FakeResponse(206, [body[start:]])
+
+    downloader.session = SimpleNamespace(get=get)
+    seg_path = tmp_path / "seg_0.ts"
+    size, digest = downloader._fetch_segment("https://example.com/seg0.ts", str(seg_path))
+    assert requested == [None, 'bytes=4-']
+    assert seg_path.read_bytes() == body
+    assert (size, digest) == (len(body), hashlib.sha256(body).hexdigest())
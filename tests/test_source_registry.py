@@ -0,0 +1,91 @@
+import pytest
+
+from paths import place_srt
+from source_registry import SourceRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO2SUM_STATE_DIR", str(tmp_path / "state"))
+    return SourceRegistry()
+
+
+def _process_local_file(registry, video, output_dir):
+    """模擬 run() 對本地影片的階段：轉錄出 SRT、整理筆記、搬移 SRT、登記完成"""
+    srt = output_dir / "talk.srt"
+    md = output_dir / "talk.md"
+    srt.write_text("1\n00:00:00,000 --> 00:00:01,000\nhello\n", encoding="utf-8")
+    registry.record(registry.source_key(str(video)), str(video), "transcribe", output_dir, srt=srt)
+    md.write_text("notes", encoding="utf-8")
+    # 本地影片的 SRT 已在輸出位置，搬移時不能被備份掉
+    assert place_srt(srt, srt) == srt
+    registry.record(registry.source_key(str(video)), str(video), "summarize", output_dir, srt=srt, md=md)
+    return srt, md
+
+
+def test_local_file_second_run_short_circuits(registry, tmp_path):
+    video = tmp_path / "input" / "talk.mp4"
+    video.parent.mkdir()
+    video.write_bytes(b"fake video bytes")
+    output_dir = tmp_path / "Media_Notes" / "Misc" / "Misc" / "talk"
+    output_dir.mkdir(parents=True)
+
+    key = registry.source_key(str(video))
+    assert key.startswith("file:")
+    assert registry.lookup(key) is None
+
+    srt, md = _process_local_file(registry, video, output_dir)
+    assert srt.exists()
+    assert not list(output_dir.glob("*.bak_*"))
+
+    entry = registry.lookup(registry.source_key(str(video)))
+    assert entry is not None
+    assert entry['artifacts']['srt']['path'] == str(srt)
+    assert entry['modified'] == []
+
+
+def test_place_srt_backs_up_a_different_existing_file(tmp_path):
+    source = tmp_path / "input.srt"
+    target = tmp_path / "out" / "talk.srt"
+    target.parent.mkdir()
+    source.write_text("new", encoding="utf-8")
+    target.write_text("old", encoding="utf-8")
+    assert place_srt(source, target) == target
+    assert target.read_text(encoding="utf-8") == "new"
+    assert not source.exists()
+    assert len(list(target.parent.glob("talk.srt.bak_*"))) == 1
+
+
+def test_summary_params_mismatch_is_not_processed(registry, tmp_path):
+    srt = tmp_path / "talk.srt"
+    md = tmp_path / "talk.md"
+    srt.write_text("srt", encoding="utf-8")
+    md.write_text("notes", encoding="utf-8")
+    params = {'model': 'gemini-2.5-pro', 'prompt_version': 1}
+    key = registry.source_key("https://www.youtube.com/watch?v=abc")
+    registry.record(key, "https://youtu.be/abc", "transcribe", tmp_path, srt=srt)
+    registry.record(key, "https://youtu.be/abc", "summarize", tmp_path, params=params, srt=srt, md=md)
+
+    assert registry.lookup(key, params) is not None
+    assert registry.lookup(key, {'model': 'gemini-2.5-flash', 'prompt_version': 1}) is None
+    assert registry.lookup(key, {'model': 'gemini-2.5-pro', 'prompt_version': 2}) is None
+    # 以新設定重新整理後再次視為已處理
+    registry.record(key, "https://youtu.be/abc", "summarize", tmp_path,
+                    params={'model': 'gemini-2.5-pro', 'prompt_version': 2}, srt=srt, md=md)
+    assert registry.lookup(key, {'model': 'gemini-2.5-pro', 'prompt_version': 2}) is not None
+
+
+def test_registry_upgrades_database_without_params(tmp_path, monkeypatch):
+    import sqlite3
+    monkeypatch.setenv("VIDEO2SUM_STATE_DIR", str(tmp_path / "state"))
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sources (key TEXT PRIMARY KEY, source TEXT NOT NULL, output_dir TEXT,"
+                 " stages TEXT NOT NULL, artifacts TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO sources VALUES ('url:x', 'x', NULL, '{\"summarize\": 1}', '{}', 1)")
+    conn.commit()
+    conn.close()
+    registry = SourceRegistry(path)
+    assert registry.lookup('url:x') is not None
+    # 舊紀錄不知道以哪個模型整理，指定設定時重新整理
+    assert registry.lookup('url:x', {'model': 'm', 'prompt_version': 1}) is None
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+import transcription
+from audio_decode import SAMPLE_RATE
+from transcription import TranscriptCheckpoint, merge_chunks, silence_split_points
+
+
+PARAMS = {'model': 'small', 'engine': 'whisper', 'language': 'zh', 'audio': 'abc'}
+
+
+def test_checkpoint_is_opt_in(monkeypatch):
+    monkeypatch.delenv("VIDEO2SUM_CHECKPOINT", raising=False)
+    assert not transcription.checkpoint_enabled()
+    monkeypatch.setenv("VIDEO2SUM_CHECKPOINT", "1")
+    assert transcription.checkpoint_enabled()
+
+
+def test_checkpoint_drops_torn_line_and_keeps_appending(tmp_path):
+    path = tmp_path / ".transcript.jsonl"
+    checkpoint = TranscriptCheckpoint(path, PARAMS)
+    checkpoint.record(16000, [{'start': 0.0, 'end': 1.0, 'text': '第一段'}], '第一段')
+    checkpoint.record(32000, [{'start': 1.0, 'end': 2.0, 'text': '第二段'}], '第二段')
+    # 模擬寫到一半被終止：最後一行沒有換行也不是完整的 JSON
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"end": 48000, "segm')
+
+    resumed = TranscriptCheckpoint(path, PARAMS)
+    assert resumed.offset == 32000
+    assert resumed.prompt == '第二段'
+    assert [seg['text'] for seg in resumed.segments] == ['第一段', '第二段']
+
+    # 殘缺的位元組已被截掉，接續寫入的視窗能完整讀回
+    resumed.record(48000, [{'start': 2.0, 'end': 3.0, 'text': '第三段'}], '第三段')
+    again = TranscriptCheckpoint(path, PARAMS)
+    assert again.offset == 48000
+    assert [seg['text'] for seg in again.segments] == ['第一段', '第二段', '第三段']
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert all(json.loads(line) for line in lines)
+
+
+def test_checkpoint_from_another_run_starts_over(tmp_path):
+    path = tmp_path / ".transcript.jsonl"
+    TranscriptCheckpoint(path, PARAMS).record(16000, [{'start': 0.0, 'end': 1.0, 'text': 'x'}], 'x')
+    other = TranscriptCheckpoint(path, dict(PARAMS, model='large-v3'))
+    assert other.offset == 0
+    assert other.segments == []
+
+
+def test_merge_chunks_drops_overlap_duplicates():
+    # 切點在 60 秒；第一段多轉錄了 2 秒重疊區，第二段從切點開始
+    first = [
+        {'start': 50.0, 'end': 55.0, 'text': 'first sentence'},
+        {'start': 58.0, 'end': 61.5, 'text': 'Crossing the cut point.'},
+        {'start': 61.0, 'end': 62.0, 'text': 'only in the overlap'},
+    ]
+    second = [
+        {'start': 60.2, 'end': 61.4, 'text': 'crossing the cut point'},
+        {'start': 61.4, 'end': 65.0, 'text': 'next sentence'},
+    ]
+    merged = merge_chunks([first, second], [0.0, 60.0, 120.0])
+    assert [s['text'] for s in merged] == ['first sentence', 'Crossing the cut point.', 'next sentence']
+    # 保留的句子結束時間被截到下一句開始，字幕不重疊
+    assert merged[1]['end'] == pytest.approx(61.4)
+    assert all(a['end'] <= b['start'] for a, b in zip(merged, merged[1:]))
+
+
+def test_merge_chunks_keeps_distinct_sentences_in_overlap():
+    first = [{'start': 58.0, 'end': 60.5, 'text': 'one thing'}]
+    second = [{'start': 60.1, 'end': 62.0, 'text': 'a completely different thing'}]
+    merged = merge_chunks([first, second], [0.0, 60.0, 120.0])
+    assert [s['text'] for s in merged] == ['one thing', 'a completely different thing']
+    assert merged[0]['end'] == pytest.approx(60.1)
+
+
+def test_silence_split_points_cut_in_the_quietest_gap():
+    rng = np.random.default_rng(0)
+    audio = (0.1 * rng.standard_normal(150 * SAMPLE_RATE)).astype(np.float32)
+    for gap in (55.0, 118.0):
+        audio[int(gap * SAMPLE_RATE):int((gap + 0.5) * SAMPLE_RATE)] = 0.0
+    points = silence_split_points(audio, 60.0)
+    # 各切點落在目標長度附近的靜音內；剩下不到四分之一段（15 秒）時不再切
+    assert len(points) == 2
+    assert 55.0 <= points[0] <= 55.5
+    assert 118.0 <= points[1] <= 118.5
+
+
+def test_silence_split_points_short_audio_is_not_split():
+    audio = np.ones(70 * SAMPLE_RATE, dtype=np.float32)
+    assert silence_split_points(audio, 60.0) == []
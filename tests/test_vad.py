@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import vad
+from audio_decode import SAMPLE_RATE
+from vad import SpeechMap, detect_speech
+
+
+def _voice(seconds, f0, seed=0):
+    """以諧波堆疊加上每秒 4 個音節的包絡模擬有聲語音"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 40) if k * f0 < 7000)
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + seed), 0, None) ** 0.5
+    return (0.3 * signal / np.abs(signal).max() * envelope).astype(np.float32)
+
+
+def _music(seconds, scale=1.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    chord = np.sin(2 * np.pi * 110 * t) + 0.5 * np.sin(2 * np.pi * 220 * t) + 0.3 * np.sin(2 * np.pi * 165 * t)
+    return (0.2 * scale * chord).astype(np.float32)
+
+
+def _silence(seconds):
+    rng = np.random.default_rng(1)
+    return (0.0005 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def _covered(regions, start, end):
+    return any(s <= start and e >= end for s, e in regions)
+
+
+def test_vad_is_opt_in(monkeypatch):
+    monkeypatch.delenv("VIDEO2SUM_VAD", raising=False)
+    assert not vad.vad_enabled()
+    monkeypatch.setenv("VIDEO2SUM_VAD", "1")
+    assert vad.vad_enabled()
+
+
+def test_low_pitched_speech_is_kept_and_long_silence_skipped():
+    audio = np.concatenate([_voice(10, 85), _silence(10), _voice(10, 85, seed=1)])
+    regions = detect_speech(audio)
+    assert _covered(regions, 0.0, 10.0)
+    assert _covered(regions, 20.0, 30.0)
+    # 中間 10 秒靜音扣掉前後餘量後應被跳過
+    assert not _covered(regions, 12.0, 18.0)
+
+
+def test_speech_over_music_bed_is_kept_but_music_alone_is_skipped():
+    audio = np.concatenate([_voice(10, 90) + _music(10, 0.5), _music(10, 0.5),
+                            _silence(10), _voice(10, 90, seed=2)])
+    regions = detect_speech(audio)
+    assert _covered(regions, 0.0, 10.0)
+    assert _covered(regions, 30.0, 40.0)
+    assert not any(s < 18.0 and e > 12.0 for s, e in regions)
+
+
+def test_speech_map_compacts_and_remaps_to_original_timeline():
+    audio = np.arange(20 * SAMPLE_RATE, dtype=np.float32)
+    mapping = SpeechMap([(0.0, 2.0), (10.0, 12.0)], 20.0)
+    assert mapping.speech_seconds == pytest.approx(4.0)
+    assert mapping.skipped_seconds == pytest.approx(16.0)
+
+    compact = mapping.compact(audio)
+    assert len(compact) == 4 * SAMPLE_RATE
+    assert compact[2 * SAMPLE_RATE] == audio[10 * SAMPLE_RATE]
+
+    assert mapping.to_original(1.0) == pytest.approx(1.0)
+    assert mapping.to_original(3.0) == pytest.approx(11.0)
+    # 剛好落在接點：開始時間屬於後一段，結束時間屬於前一段
+    assert mapping.to_original(2.0) == pytest.approx(10.0)
+    assert mapping.to_original(2.0, is_end=True) == pytest.approx(2.0)
+
+    segments = mapping.remap_segments([{'start': 1.5, 'end': 2.0, 'text': 'a'},
+                                       {'start': 2.0, 'end': 3.5, 'text': 'b'}])
+    assert [(s['start'], s['end']) for s in segments] == [pytest.approx((1.5, 2.0)),
+                                                          pytest.approx((10.0, 11.5))]
+    assert segments[1]['text'] == 'b'
+
+
+def test_speech_map_skips_nothing_without_speech():
+    assert vad.speech_map(_silence(10)) is None